@@ -9,7 +9,16 @@ class ConfigManager:
         "hotkey": "option+space",
         "search_paths": [os.path.expanduser("~")],
         "exclude_rules": "",
-        "show_hidden": False
+        # 首次建立索引时优先扫描的目录
+        "pinned_paths": ["~/Desktop", "~/Documents", "~/Downloads"],
+        "show_hidden": False,
+        "content_index": False,
+        # 重建索引速率上限（文件/秒），0 表示不限
+        "index_files_per_sec": 0,
+        # 监听事件录制文件路径（用于复现事件风暴），空字符串表示不录制
+        "event_trace": "",
+        # 界面停顿采样阈值（毫秒），超过即记录主线程调用栈到 ~/.mac_search_stalls.log；0 表示关闭
+        "stall_watchdog_ms": 0
     }
 
     def load_config(self):
@@ -25,6 +34,14 @@ class ConfigManager:
         except Exception:
             return self.DEFAULT_CONFIG.copy()
 
+    def diff(self, old, new):
+        """比较两份配置，返回变化的字段；search_paths 额外拆成 added_paths / removed_paths"""
+        changes = {k: new.get(k) for k in set(old) | set(new) if old.get(k) != new.get(k)}
+        old_paths, new_paths = old.get("search_paths", []), new.get("search_paths", [])
+        changes["added_paths"] = [p for p in new_paths if p not in old_paths]
+        changes["removed_paths"] = [p for p in old_paths if p not in new_paths]
+        return changes
+
     def save_config(self, cfg):
         try:
             with open(self.PATH, "w") as f:
@@ -0,0 +1,131 @@
+# content_grep.py
+import os
+import re
+import mmap
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from PyQt5.QtCore import QThread, pyqtSignal
+from file_record import FileRecord
+
+# 实时 grep 单文件大小上限
+MAX_GREP_SIZE = 32 * 1024 * 1024
+
+_pool = None
+_manager = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """进程池常驻复用，避免每次按键都重新拉起子进程"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max(1, min(os.cpu_count() or 2, 8)))
+        return _pool
+
+
+def _cancel_event():
+    """跨进程的取消标志：由常驻的 Manager 进程持有，子进程通过代理读取"""
+    global _manager
+    with _pool_lock:
+        if _manager is None:
+            _manager = multiprocessing.Manager()
+        return _manager.Event()
+
+
+def shutdown_pool():
+    global _pool, _manager
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _manager is not None:
+            _manager.shutdown()
+            _manager = None
+
+
+def _grep_chunk(rows, pattern, is_regex, max_size, cancel=None):
+    """子进程中执行：用 mmap 扫描一组文件，命中即停止该文件的扫描；
+    每个文件开始前检查 cancel，查询被取消后已在执行的分块也能尽快让出进程"""
+    flags = re.IGNORECASE | re.MULTILINE
+    try:
+        regex = re.compile(pattern if is_regex else re.escape(pattern), flags)
+    except re.error:
+        return []
+    hits = []
+    for path, name, mtime, size in rows:
+        if cancel is not None and cancel.is_set():
+            break
+        if size == 0 or size > max_size:
+            continue
+        try:
+            with open(path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    # re 直接作用于 mmap 缓冲区，不会把文件读成 Python 字符串
+                    if regex.search(mm):
+                        hits.append((path, name, mtime, size))
+        except (OSError, ValueError):
+            continue
+    return hits
+
+
+class ContentGrepThread(QThread):
+    """实时内容 grep：从索引取候选文件，进程池并行 mmap 扫描，分批回传结果"""
+    results_batch_found = pyqtSignal(list)
+    search_finished = pyqtSignal()
+
+    CHUNK_SIZE = 32
+
+    def __init__(self, index_mgr, search_mgr, max_candidates=20000, max_size=MAX_GREP_SIZE):
+        super().__init__()
+        self.index_mgr = index_mgr
+        # 快照查询条件，避免下一次按键改写 SearchManager 时串扰
+        self.pattern = search_mgr.grep_pattern
+        self.is_regex = search_mgr.grep_regex
+        self.filters = index_mgr.compile_filters(search_mgr)
+        self.name_regex = search_mgr.name_regex
+        self.max_candidates = max_candidates
+        self.max_size = max_size
+        self.stop_flag = False
+        self._futures = []
+        self._cancel = None
+
+    def stop(self):
+        """未开始的分块直接取消，已在子进程中执行的分块在下一个文件前退出"""
+        self.stop_flag = True
+        if self._cancel is not None:
+            self._cancel.set()
+        for f in self._futures:
+            f.cancel()
+
+    def run(self):
+        if not self.pattern:
+            self.search_finished.emit()
+            return
+        rows = self.index_mgr.grep_candidates(self.filters, self.max_size, self.max_candidates,
+                                              cancelled=lambda: self.stop_flag)
+        if self.name_regex is not None:
+            rows = [r for r in rows if self.name_regex.search(r[1])]
+        if self.stop_flag: return
+
+        pool = _get_pool()
+        self._cancel = _cancel_event()
+        if self.stop_flag: return
+        pattern = self.pattern.encode('utf-8')
+        for i in range(0, len(rows), self.CHUNK_SIZE):
+            chunk = rows[i:i + self.CHUNK_SIZE]
+            self._futures.append(pool.submit(_grep_chunk, chunk, pattern, self.is_regex,
+                                             self.max_size, self._cancel))
+
+        # 按提交顺序（即 mtime 倒序）取回结果，保证先出最近修改的文件
+        for f in self._futures:
+            if self.stop_flag: return
+            try:
+                hits = f.result()
+            except Exception:
+                continue
+            if hits and not self.stop_flag:
+                self.results_batch_found.emit(FileRecord.from_rows(hits))
+        if not self.stop_flag:
+            self.search_finished.emit()
@@ -0,0 +1,243 @@
+# content_index.py
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from file_record import FileRecord
+
+# 参与内容索引的文本类后缀（纯文本、源码、标记语言、配置文件等）
+TEXT_EXTS = {
+    '.txt', '.md', '.markdown', '.rst', '.org', '.tex', '.log', '.csv', '.tsv',
+    '.json', '.yaml', '.yml', '.toml', '.ini', '.cfg', '.conf', '.xml', '.plist',
+    '.html', '.htm', '.css', '.scss', '.less', '.svg',
+    '.py', '.pyi', '.js', '.jsx', '.ts', '.tsx', '.vue', '.java', '.kt', '.swift',
+    '.m', '.mm', '.c', '.h', '.cc', '.cpp', '.hpp', '.cs', '.go', '.rs', '.rb',
+    '.php', '.pl', '.lua', '.r', '.scala', '.dart', '.sql', '.sh', '.bash', '.zsh',
+    '.fish', '.bat', '.ps1', '.gradle', '.cmake', '.mk', '.dockerfile', '.env',
+}
+
+# 单文件大小上限，超过则不提取内容
+MAX_CONTENT_SIZE = 2 * 1024 * 1024
+
+
+def _extract_text(path, max_size):
+    """子进程中执行：读取并解码文本，返回 (path, mtime, size, text)，失败时 text 为 None"""
+    try:
+        st = os.stat(path)
+        if st.st_size > max_size:
+            return path, st.st_mtime, st.st_size, None
+        with open(path, 'rb') as f:
+            data = f.read(max_size)
+        # 含 NUL 字节基本可以判定为二进制文件
+        if b'\x00' in data[:8192]:
+            return path, st.st_mtime, st.st_size, None
+        for enc in ('utf-8', 'gb18030'):
+            try:
+                return path, st.st_mtime, st.st_size, data.decode(enc)
+            except UnicodeDecodeError:
+                continue
+        return path, st.st_mtime, st.st_size, data.decode('utf-8', errors='ignore')
+    except OSError:
+        return path, None, None, None
+
+
+class ContentIndexer:
+    """全文内容索引：FTS5 表 + (mtime, size) 增量判断 + 后台进程池提取"""
+
+    BATCH_SIZE = 200
+
+    def __init__(self, db_path=None, max_size=MAX_CONTENT_SIZE, workers=None):
+        self.db_path = db_path or str(Path.home() / ".mac_search_content.db")
+        self.max_size = max_size
+        self.workers = workers or max(1, min((os.cpu_count() or 2) - 1, 4))
+
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+
+        # 待处理队列：path -> (mtime, size)，同一路径多次变动只保留最后一次
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._running = True
+        self._pool = None
+        self._init_db()
+
+        self._thread = threading.Thread(target=self._drain_loop, daemon=True)
+        self._thread.start()
+
+    def _init_db(self):
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS content_meta (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT UNIQUE NOT NULL,
+                    mtime REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )
+            ''')
+            # trigram 分词对中文与任意子串都有效；老版本 SQLite 退回默认分词
+            try:
+                cursor.execute('''
+                    CREATE VIRTUAL TABLE IF NOT EXISTS content_fts
+                    USING fts5(body, tokenize='trigram')
+                ''')
+            except sqlite3.OperationalError:
+                cursor.execute('CREATE VIRTUAL TABLE IF NOT EXISTS content_fts USING fts5(body)')
+            self.conn.commit()
+
+    def is_candidate(self, path, size):
+        name = os.path.basename(path).lower()
+        ext = os.path.splitext(name)[1]
+        return size <= self.max_size and (ext in TEXT_EXTS or name == 'dockerfile' or name == 'makefile')
+
+    def enqueue(self, rows):
+        """rows: 可迭代的 (path, mtime, size)，只有真正变化的文件才会被重新提取"""
+        added = False
+        with self._cond:
+            for path, mtime, size in rows:
+                if self.is_candidate(path, size):
+                    self._pending[path] = (mtime, size)
+                    added = True
+            if added:
+                self._cond.notify()
+
+    def sync(self, rows):
+        """全量重建后调用：对比 file_index 的 (path, mtime, size)，清理已消失的条目并补齐变动"""
+        live = {}
+        for path, mtime, size in rows:
+            if self.is_candidate(path, size):
+                live[path] = (mtime, size)
+
+        with self.lock:
+            known = self.conn.execute('SELECT id, path FROM content_meta').fetchall()
+            stale = [(i,) for i, p in known if p not in live]
+            if stale:
+                self.conn.executemany('DELETE FROM content_fts WHERE rowid = ?', stale)
+                self.conn.executemany('DELETE FROM content_meta WHERE id = ?', stale)
+                self.conn.commit()
+
+        self.enqueue((p, m, s) for p, (m, s) in live.items())
+
+    def remove(self, path):
+        with self._cond:
+            self._pending.pop(path, None)
+        with self.lock:
+            row = self.conn.execute('SELECT id FROM content_meta WHERE path = ?', (path,)).fetchone()
+            if row:
+                self.conn.execute('DELETE FROM content_fts WHERE rowid = ?', row)
+                self.conn.execute('DELETE FROM content_meta WHERE id = ?', row)
+                self.conn.commit()
+
+    def remove_prefix(self, prefix):
+        """目录被删除/移走：按 path 唯一索引的范围删除整棵子树，排队中的条目一并丢弃"""
+        end = prefix + '\U0010ffff'
+        with self._cond:
+            for path in [p for p in self._pending if p.startswith(prefix)]:
+                del self._pending[path]
+        with self.lock:
+            stale = self.conn.execute(
+                'SELECT id FROM content_meta WHERE path >= ? AND path < ?', (prefix, end)
+            ).fetchall()
+            if stale:
+                self.conn.executemany('DELETE FROM content_fts WHERE rowid = ?', stale)
+                self.conn.executemany('DELETE FROM content_meta WHERE id = ?', stale)
+                self.conn.commit()
+
+    def _take_batch(self):
+        with self._cond:
+            while self._running and not self._pending:
+                self._cond.wait()
+            if not self._running:
+                return []
+            batch = []
+            for path in list(self._pending)[:self.BATCH_SIZE]:
+                batch.append((path,) + self._pending.pop(path))
+            return batch
+
+    def _changed(self, batch):
+        """过滤出 (mtime, size) 与已索引记录不一致的文件"""
+        with self.lock:
+            changed = []
+            for path, mtime, size in batch:
+                row = self.conn.execute(
+                    'SELECT mtime, size FROM content_meta WHERE path = ?', (path,)
+                ).fetchone()
+                if row is None or row[0] != mtime or row[1] != size:
+                    changed.append(path)
+            return changed
+
+    def _drain_loop(self):
+        while self._running:
+            batch = self._take_batch()
+            if not batch:
+                continue
+            paths = self._changed(batch)
+            if not paths:
+                continue
+            try:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                results = list(self._pool.map(
+                    _extract_text, paths, [self.max_size] * len(paths), chunksize=16
+                ))
+                self._store(results)
+            except Exception as e:
+                print(f"[ContentIndexer] 内容提取失败: {e}")
+
+    def _store(self, results):
+        with self.lock:
+            cursor = self.conn.cursor()
+            for path, mtime, size, text in results:
+                row = cursor.execute('SELECT id FROM content_meta WHERE path = ?', (path,)).fetchone()
+                if row:
+                    cursor.execute('DELETE FROM content_fts WHERE rowid = ?', row)
+                if mtime is None:
+                    # 文件已消失
+                    cursor.execute('DELETE FROM content_meta WHERE path = ?', (path,))
+                    continue
+                # 二进制/超限文件也记录 meta，避免反复尝试提取
+                cursor.execute('''
+                    INSERT INTO content_meta (path, mtime, size) VALUES (?, ?, ?)
+                    ON CONFLICT(path) DO UPDATE SET mtime = excluded.mtime, size = excluded.size
+                ''', (path, mtime, size))
+                if text:
+                    rowid = cursor.execute('SELECT id FROM content_meta WHERE path = ?', (path,)).fetchone()[0]
+                    cursor.execute('INSERT INTO content_fts (rowid, body) VALUES (?, ?)', (rowid, text))
+            self.conn.commit()
+
+    def search(self, text, max_results=1000):
+        """按内容检索，返回与 IndexManager.search_name 相同结构的结果"""
+        text = text.strip()
+        if not text: return []
+        with self.lock:
+            cursor = self.conn.cursor()
+            if len(text) >= 3:
+                # 整体作为短语匹配，转义双引号
+                phrase = '"' + text.replace('"', '""') + '"'
+                cursor.execute('''
+                    SELECT m.path, m.mtime, m.size FROM content_fts f
+                    JOIN content_meta m ON m.id = f.rowid
+                    WHERE content_fts MATCH ?
+                    ORDER BY m.mtime DESC
+                    LIMIT ?
+                ''', (phrase, max_results))
+            else:
+                # trigram 无法处理少于 3 个字符的查询，退回 LIKE
+                cursor.execute('''
+                    SELECT m.path, m.mtime, m.size FROM content_fts f
+                    JOIN content_meta m ON m.id = f.rowid
+                    WHERE f.body LIKE ?
+                    ORDER BY m.mtime DESC
+                    LIMIT ?
+                ''', (f'%{text}%', max_results))
+            return [FileRecord(p, os.path.basename(p), m, s) for p, m, s in cursor.fetchall()]
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,197 @@
+# duplicate_finder.py
+import os
+import mmap
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from PyQt5.QtCore import QThread, pyqtSignal
+
+# 部分哈希读取的首尾字节数；不超过 2 倍该值的文件，部分哈希即覆盖全文
+PARTIAL_BYTES = 64 * 1024
+# 全量哈希时每次喂给哈希函数的切片大小
+FULL_SLICE = 4 * 1024 * 1024
+
+
+def _digest(path, full):
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            h = hashlib.blake2b(digest_size=16)
+            if not full and len(mm) > 2 * PARTIAL_BYTES:
+                h.update(mm[:PARTIAL_BYTES])
+                h.update(mm[-PARTIAL_BYTES:])
+            else:
+                view = memoryview(mm)
+                try:
+                    for i in range(0, len(mm), FULL_SLICE):
+                        h.update(view[i:i + FULL_SLICE])
+                finally:
+                    view.release()
+            return h.hexdigest()
+
+
+def _hash_chunk(rows, full):
+    """子进程中执行：mmap 读取并计算哈希，返回 [(path, mtime, size, digest)]，失败时 digest 为 None"""
+    out = []
+    for path, mtime, size in rows:
+        try:
+            out.append((path, mtime, size, _digest(path, full)))
+        except (OSError, ValueError):
+            out.append((path, mtime, size, None))
+    return out
+
+
+class HashCache:
+    """哈希缓存：以 (path, mtime, size) 为准，文件未变化时重复查重无需再次读取"""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or str(Path.home() / ".mac_search_hashes.db")
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS file_hash (
+                    path TEXT PRIMARY KEY,
+                    mtime REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    partial TEXT,
+                    full TEXT
+                ) WITHOUT ROWID
+            ''')
+            self.conn.commit()
+
+    def lookup(self, records, column):
+        """返回 {path: 哈希}，只包含 mtime/size 与记录一致且该列已计算的条目"""
+        found = {}
+        with self.lock:
+            for rec in records:
+                row = self.conn.execute(
+                    f'SELECT mtime, size, {column} FROM file_hash WHERE path = ?', (rec.path,)
+                ).fetchone()
+                if row and row[0] == rec.mtime and row[1] == rec.size and row[2]:
+                    found[rec.path] = row[2]
+        return found
+
+    def store(self, results, column):
+        """results: [(path, mtime, size, digest)]；文件变化时另一列的旧哈希一并作废"""
+        rows = [r for r in results if r[3]]
+        if not rows: return
+        other = 'full' if column == 'partial' else 'partial'
+        with self.lock:
+            self.conn.executemany(f'''
+                INSERT INTO file_hash (path, mtime, size, {column}) VALUES (?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    {other} = CASE WHEN file_hash.mtime = excluded.mtime AND file_hash.size = excluded.size
+                                   THEN file_hash.{other} END,
+                    {column} = excluded.{column},
+                    mtime = excluded.mtime,
+                    size = excluded.size
+            ''', rows)
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class DuplicateFinderThread(QThread):
+    """重复文件查找：size 分组 -> 首尾部分哈希 -> 全量哈希，逐组回传结果"""
+    # 一组内容完全相同的文件 [FileRecord, ...]
+    group_found = pyqtSignal(list)
+    progress = pyqtSignal(str)
+    search_finished = pyqtSignal()
+
+    CHUNK_SIZE = 16
+    # 每凑够这么多候选文件处理一轮并汇报一次进度
+    ROUND_FILES = 512
+
+    def __init__(self, index_mgr, search_mgr, min_size=1, workers=None):
+        super().__init__()
+        self.index_mgr = index_mgr
+        # 快照查询条件：dupes: 之后的 in:/size:/kind: 等条件同样用于收窄候选
+        self.filters = index_mgr.compile_filters(search_mgr)
+        self.min_size = max(1, min_size)
+        self.workers = workers or max(1, min((os.cpu_count() or 2) - 1, 6))
+        self.stop_flag = False
+        self._pool = None
+        self._futures = []
+
+    def stop(self):
+        self.stop_flag = True
+        for f in self._futures:
+            f.cancel()
+
+    def _hash_all(self, records, column):
+        """先查缓存，未命中的按块提交到进程池；返回 {path: 哈希}"""
+        digests = self.cache.lookup(records, column)
+        todo = [(r.path, r.mtime, r.size) for r in records if r.path not in digests]
+        self._futures = [
+            self._pool.submit(_hash_chunk, todo[i:i + self.CHUNK_SIZE], column == 'full')
+            for i in range(0, len(todo), self.CHUNK_SIZE)
+        ]
+        for f in self._futures:
+            if self.stop_flag: return digests
+            try:
+                results = f.result()
+            except Exception:
+                continue
+            self.cache.store(results, column)
+            digests.update((p, d) for p, _, _, d in results if d)
+        return digests
+
+    @staticmethod
+    def _regroup(groups, digests):
+        out = []
+        for group in groups:
+            by_hash = {}
+            for rec in group:
+                d = digests.get(rec.path)
+                if d is not None:
+                    by_hash.setdefault(d, []).append(rec)
+            out.extend(g for g in by_hash.values() if len(g) > 1)
+        return out
+
+    def _process(self, buckets):
+        # 1. 首尾部分哈希：大多数“同大小”的文件在这一步就被区分开
+        digests = self._hash_all([r for b in buckets for r in b], 'partial')
+        if self.stop_flag: return
+        groups = self._regroup(buckets, digests)
+
+        # 2. 只有部分哈希相同、且部分哈希未覆盖全文的文件才需要全量哈希
+        small = [g for g in groups if g[0].size <= 2 * PARTIAL_BYTES]
+        large = [g for g in groups if g[0].size > 2 * PARTIAL_BYTES]
+        if large:
+            digests = self._hash_all([r for g in large for r in g], 'full')
+            if self.stop_flag: return
+            large = self._regroup(large, digests)
+
+        for group in sorted(small + large, key=lambda g: -g[0].size):
+            if self.stop_flag: return
+            self.group_found.emit(sorted(group, key=lambda r: r.path))
+
+    def run(self):
+        self.cache = HashCache()
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        scanned = 0
+        try:
+            pending, pending_files = [], 0
+            for bucket in self.index_mgr.duplicate_candidates(self.filters, self.min_size,
+                                                              cancelled=lambda: self.stop_flag):
+                if self.stop_flag: return
+                pending.append(bucket)
+                pending_files += len(bucket)
+                if pending_files >= self.ROUND_FILES:
+                    self._process(pending)
+                    scanned += pending_files
+                    self.progress.emit(f"查重中... 已检查 {scanned} 个候选文件")
+                    pending, pending_files = [], 0
+            if pending and not self.stop_flag:
+                self._process(pending)
+        finally:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self.cache.close()
+            if not self.stop_flag:
+                self.search_finished.emit()
@@ -0,0 +1,288 @@
+# event_trace.py
+# 监听事件录制与回放：把真实的 watchdog 事件流录成紧凑的 trace 文件，
+# 之后在合成目录树上按原速或加速回放给 IndexManager（不启动真实的 Observer），
+# 测量写入吞吐、写入期间的搜索延迟，以及回放结束后索引与磁盘实际状态的偏差。
+#
+# 用法：
+#   配置文件中设置 "event_trace": "~/quicksearch-events.trace.gz" 即开始录制
+#   python event_trace.py ~/quicksearch-events.trace.gz --speed 10 --query report
+import os
+import sys
+import gzip
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import threading
+
+# 事件类型 -> 单字符编码，目录事件使用大写
+KIND_CODES = {'created': 'c', 'modified': 'm', 'deleted': 'd', 'moved': 'v'}
+CODE_KINDS = {v: k for k, v in KIND_CODES.items()}
+TRACE_VERSION = 1
+
+
+class TraceRecorder:
+    """把事件追加写入 gzip 文本：每行 “距上一事件毫秒 类型 根序号 相对路径 大小 [目标根序号 目标相对路径]”。
+    路径相对所属搜索根目录保存，回放时映射到合成目录树；文件大小用于在回放时生成同样大小的文件"""
+
+    FLUSH_EVERY = 200
+
+    def __init__(self, trace_path, mgr):
+        self.mgr = mgr
+        self.roots = list(mgr.search_paths)
+        self.lock = threading.Lock()
+        self._last = time.time()
+        self._count = 0
+        header = {'v': TRACE_VERSION, 'roots': self.roots, 'started': self._last,
+                  'show_hidden': mgr.show_hidden, 'exclude_rules': mgr.exclude_rules}
+        # gzip 支持多成员拼接，追加写入的文件仍可整体读取
+        self.f = gzip.open(trace_path, 'at', encoding='utf-8')
+        self.f.write('#' + json.dumps(header, ensure_ascii=False) + '\n')
+
+    def _locate(self, path):
+        """(根序号, 相对路径)；不在任何根目录下返回 None"""
+        best = None
+        for i, root in enumerate(self.roots):
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                if best is None or len(root) > len(self.roots[best]):
+                    best = i
+        if best is None: return None
+        return best, os.path.relpath(path, self.roots[best])
+
+    def record(self, event):
+        code = KIND_CODES.get(event.event_type)
+        src = self._locate(event.src_path) if code else None
+        if src is None: return
+        if event.is_directory:
+            code = code.upper()
+        size = ''
+        if event.event_type in ('created', 'modified') and not event.is_directory:
+            try:
+                size = str(os.stat(event.src_path).st_size)
+            except OSError:
+                pass
+        fields = [None, code, str(src[0]), src[1], size]
+        if event.event_type == 'moved':
+            dest = self._locate(event.dest_path)
+            if dest is None:
+                # 移出搜索范围等同于删除
+                fields[1] = 'D' if event.is_directory else 'd'
+            else:
+                fields += [str(dest[0]), dest[1]]
+        with self.lock:
+            now = time.time()
+            fields[0] = str(int((now - self._last) * 1000))
+            self._last = now
+            # 路径中的制表符/换行会破坏行格式，这类事件直接丢弃
+            if any('\t' in f or '\n' in f for f in fields[3:]): return
+            self.f.write('\t'.join(fields) + '\n')
+            self._count += 1
+            if self._count % self.FLUSH_EVERY == 0:
+                self.f.flush()
+
+    def close(self):
+        with self.lock:
+            self.f.close()
+
+
+def read_trace(trace_path):
+    """返回 (header, events)；events 为 [(相对起点秒数, 类型, 是否目录, (根序号, 相对路径), 大小, 目标或 None)]。
+    多段录制拼接在一起时，以第一段的根目录为准，后续段的时间顺延"""
+    header, events, t = None, [], 0.0
+    with gzip.open(trace_path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line: continue
+            if line.startswith('#'):
+                header = header or json.loads(line[1:])
+                continue
+            parts = line.split('\t')
+            t += int(parts[0]) / 1000
+            code = parts[1]
+            dest = (int(parts[5]), parts[6]) if len(parts) >= 7 else None
+            events.append((t, CODE_KINDS[code.lower()], code.isupper(), (int(parts[2]), parts[3]),
+                           int(parts[4]) if parts[4] else 0, dest))
+    return header or {'roots': []}, events
+
+
+class TraceReplayer:
+    """在临时目录中的合成目录树上回放 trace，直接调用 FileChangeHandler，不依赖真实的文件系统通知"""
+
+    def __init__(self, trace_path, speed=1.0, query="", workdir=None, search_interval=0.05):
+        self.header, self.events = read_trace(trace_path)
+        self.speed = speed
+        self.query = query
+        self.search_interval = search_interval
+        self.workdir = workdir or tempfile.mkdtemp(prefix="qs-replay-")
+        self.roots = [os.path.join(self.workdir, 'tree', f'root{i}') for i in range(len(self.header['roots']))]
+        self._ingesting = False
+        self.search_latencies = []
+
+    def _abs(self, loc):
+        root_idx, rel = loc
+        return os.path.normpath(os.path.join(self.roots[root_idx], rel))
+
+    @staticmethod
+    def _write(path, size):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            # 稀疏文件：只设置长度，不真正写入数据
+            f.truncate(size)
+
+    @staticmethod
+    def _before_moves(path, moves):
+        """沿此前录制的目录移动把路径倒推回移动之前的位置"""
+        for src, dst in reversed(moves):
+            if path == dst or path.startswith(dst + os.sep):
+                path = src + path[len(dst):]
+        return path
+
+    def _seed_tree(self):
+        """录制开始前就已存在的文件（第一次出现是修改/删除/移出）需要预先创建。
+        位于某次目录移动目标之下的路径要等回放到那次移动时才出现，改为创建在移动之前的源位置，
+        否则目标目录提前存在，shutil.move 会把源目录嵌套进去"""
+        for root in self.roots:
+            os.makedirs(root, exist_ok=True)
+        seen = set()
+        moves = []
+        for _, kind, is_dir, src, size, dest in self.events:
+            path = self._abs(src)
+            origin = self._before_moves(path, moves)
+            if path not in seen and origin not in seen and kind != 'created':
+                if is_dir:
+                    os.makedirs(origin, exist_ok=True)
+                elif not os.path.exists(origin):
+                    self._write(origin, size)
+            seen.add(path)
+            seen.add(origin)
+            if dest is not None:
+                dest_path = self._abs(dest)
+                seen.add(dest_path)
+                if is_dir:
+                    moves.append((path, dest_path))
+
+    def _apply(self, kind, is_dir, path, size, dest_path):
+        """先在合成目录树上执行文件操作，再构造对应的 watchdog 事件"""
+        from watchdog import events as ev
+        if kind == 'created':
+            if is_dir:
+                os.makedirs(path, exist_ok=True)
+                return ev.DirCreatedEvent(path)
+            self._write(path, size)
+            return ev.FileCreatedEvent(path)
+        if kind == 'modified':
+            if is_dir:
+                return ev.DirModifiedEvent(path)
+            self._write(path, size)
+            return ev.FileModifiedEvent(path)
+        if kind == 'deleted':
+            if is_dir:
+                shutil.rmtree(path, ignore_errors=True)
+                return ev.DirDeletedEvent(path)
+            if os.path.exists(path):
+                os.remove(path)
+            return ev.FileDeletedEvent(path)
+        if os.path.exists(path):
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            shutil.move(path, dest_path)
+        return (ev.DirMovedEvent if is_dir else ev.FileMovedEvent)(path, dest_path)
+
+    def _search_loop(self, mgr):
+        while self._ingesting:
+            started = time.perf_counter()
+            mgr.search_name(self.query, 100)
+            self.search_latencies.append((time.perf_counter() - started) * 1000)
+            time.sleep(self.search_interval)
+
+    def _divergence(self, mgr):
+        """回放结束后按当前规则重新扫描合成目录树，与索引内容逐条对比"""
+        expected = {}
+        for root in self.roots:
+            for batch in mgr._crawl(root):
+                expected.update((row[0], row[3]) for row in batch)
+        actual = {}
+        for shard in mgr.shards.values():
+            actual.update((p, s) for p, _, s in shard.all_rows())
+        missing = [p for p in expected if p not in actual]
+        extra = [p for p in actual if p not in expected]
+        wrong = [p for p, s in expected.items() if p in actual and actual[p] != s]
+        return {'expected': len(expected), 'indexed': len(actual),
+                'missing': len(missing), 'extra': len(extra), 'wrong_size': len(wrong),
+                'samples': (missing[:5], extra[:5], wrong[:5])}
+
+    def run(self):
+        from index_manager import IndexManager, FileChangeHandler
+        self._seed_tree()
+        mgr = IndexManager(self.roots, shard_dir=os.path.join(self.workdir, 'shards'),
+                           show_hidden=self.header.get('show_hidden', False),
+                           exclude_rules=self.header.get('exclude_rules', ""))
+        try:
+            mgr.rebuild_index()
+            handler = FileChangeHandler(mgr)
+
+            self._ingesting = True
+            searcher = threading.Thread(target=self._search_loop, args=(mgr,), daemon=True)
+            searcher.start()
+
+            ingest_s, max_lag, started = 0.0, 0.0, time.perf_counter()
+            for t, kind, is_dir, src, size, dest in self.events:
+                if self.speed > 0:
+                    # 按录制时的间隔（除以加速倍数）投递；落后时立即投递并记录滞后
+                    delay = t / self.speed - (time.perf_counter() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        max_lag = max(max_lag, -delay)
+                event = self._apply(kind, is_dir, self._abs(src), size, dest and self._abs(dest))
+                t0 = time.perf_counter()
+                handler.dispatch(event)
+                ingest_s += time.perf_counter() - t0
+            wall = time.perf_counter() - started
+
+            self._ingesting = False
+            searcher.join()
+            lat = sorted(self.search_latencies) or [0.0]
+            report = {
+                'events': len(self.events),
+                'wall_s': wall,
+                'ingest_s': ingest_s,
+                'events_per_s': len(self.events) / ingest_s if ingest_s else 0.0,
+                'max_lag_s': max_lag,
+                'searches': len(self.search_latencies),
+                'search_p50_ms': lat[len(lat) // 2],
+                'search_p99_ms': lat[min(len(lat) - 1, int(len(lat) * 0.99))],
+                'search_max_ms': lat[-1],
+            }
+            report.update(self._divergence(mgr))
+            return report
+        finally:
+            self._ingesting = False
+            mgr.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="回放监听事件 trace，测量索引写入吞吐与搜索延迟")
+    parser.add_argument("trace", help="录制的 trace 文件（.gz）")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速，0 表示不等待、尽快投递")
+    parser.add_argument("--query", default="", help="回放期间反复执行的搜索关键词")
+    parser.add_argument("--workdir", help="合成目录树与分片的存放目录（默认临时目录，结束后删除）")
+    args = parser.parse_args(argv)
+
+    replayer = TraceReplayer(args.trace, args.speed, args.query, args.workdir)
+    try:
+        report = replayer.run()
+    finally:
+        if not args.workdir:
+            shutil.rmtree(replayer.workdir, ignore_errors=True)
+    missing, extra, wrong = report.pop('samples')
+    for key, value in report.items():
+        print(f"{key:>14}: {value:.3f}" if isinstance(value, float) else f"{key:>14}: {value}")
+    for label, paths in (("missing", missing), ("extra", extra), ("wrong_size", wrong)):
+        for p in paths:
+            print(f"  {label}: {p}")
+    return 0 if not (missing or extra or wrong) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+# file_record.py
+
+class FileRecord:
+    """紧凑的搜索结果记录：__slots__ 避免每行一个 dict 的内存与分配开销。
+    frecency 为常用度排序键（对数形式，见 IndexShard.record_open），用于跨分片归并与翻页游标"""
+    __slots__ = ('path', 'name', 'mtime', 'size', 'frecency')
+
+    def __init__(self, path, name, mtime, size, frecency=0.0):
+        self.path = path
+        self.name = name
+        self.mtime = mtime
+        self.size = size
+        self.frecency = frecency
+
+    @classmethod
+    def from_rows(cls, rows):
+        """(path, name, mtime, size[, frecency]) 元组序列 -> 记录列表"""
+        return [cls(*r) for r in rows]
+
+    # --- 兼容旧代码：仍支持 item['path'] 与 dict(item) 的写法 ---
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return self.__slots__
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __eq__(self, other):
+        if isinstance(other, FileRecord):
+            return self.path == other.path
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __repr__(self):
+        return f"FileRecord({self.path!r}, mtime={self.mtime}, size={self.size})"
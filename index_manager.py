@@ -1,9 +1,63 @@
 import os
-import sqlite3
+import re
+import math
+import time
+import heapq
 import threading
+import hashlib
+import sqlite3
+from itertools import islice, count
+from contextlib import contextmanager
+from operator import attrgetter
+from fnmatch import fnmatchcase
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+from content_index import ContentIndexer
+from index_shard import IndexShard, file_ext
+from search_manager import scope_roots, PREFIX_END
+from regex_filter import required_literals
+from event_trace import TraceRecorder
+from pinyin_keys import pinyin_keys, is_pinyin_query
+
+
+class FileChangeHandler(FileSystemEventHandler):
+    """把 watchdog 事件转成索引增删；开启事件录制时先写入 trace 再处理"""
+    def __init__(self, mgr): self.mgr = mgr
+    def dispatch(self, event):
+        trace = self.mgr.trace
+        if trace is not None:
+            trace.record(event)
+        super().dispatch(event)
+    def _is_ignored(self, path):
+        # 与扫描使用同一套规则（忽略目录、隐藏文件、排除规则），设置变化后立即生效
+        return not self.mgr._should_index(path)
+    def on_created(self, event):
+        if not event.is_directory and not self._is_ignored(event.src_path):
+            self.mgr._update_file_async(event.src_path)
+    def on_modified(self, event):
+        if not event.is_directory and not self._is_ignored(event.src_path):
+            self.mgr._update_file_async(event.src_path)
+    def on_deleted(self, event):
+        if event.is_directory: self.mgr.remove_dir(event.src_path)
+        else: self.mgr.remove_file(event.src_path)
+    def on_moved(self, event):
+        if event.is_directory:
+            self.mgr.remove_dir(event.src_path)
+            self.mgr.add_dir(event.dest_path)
+        else:
+            self.mgr.remove_file(event.src_path)
+            if not self._is_ignored(event.dest_path):
+                self.mgr._update_file_async(event.dest_path)
+
+# 生成的 LIKE 模式都经过 like_escape，关键词里的 % 和 _ 按字面匹配
+LIKE = "LIKE ? ESCAPE '\\'"
+
+
+def like_escape(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
 
 class IndexManager:
     # 强制忽略的高频变动或无意义目录
@@ -12,126 +66,687 @@ class IndexManager:
         'Cache', 'Caches', 'Logs', 'tmp', 'Pictures/Photos Library.photoslibrary'
     }
 
-    def __init__(self, search_paths, db_path=None, show_hidden=False):
+    # 排序模式 -> (排序键, 是否降序)；最后以 path 兜底，保证翻页游标唯一。每种模式都有对应的覆盖索引
+    SORT_MODES = {
+        'frecency': (('frecency', 'mtime', 'path'), True),
+        'mtime': (('mtime', 'path'), True),
+        'name': (('name', 'path'), False),
+        'size': (('size', 'path'), True),
+        'path': (('path',), False),
+    }
+
+    # 重建时每积累这么多文件或经过这么多秒保存一次检查点
+    CHECKPOINT_FILES = 5000
+    CHECKPOINT_SECS = 2.0
+    # 搜索窗口在前台时的扫描速率上限（文件/秒）
+    FOREGROUND_FILES_PER_SEC = 2000
+    # 重建时的目录优先级 = 深度 + 目录修改时间距今天数的 log2 - 加成，数值小的先扫描：
+    # 浅层、最近有变动的目录先入索引；固定目录（及通往它的上级目录）与常打开文件所在目录再额外提前
+    CRAWL_AGE_WEIGHT = 1.0
+    CRAWL_PIN_BOOST = 16
+    CRAWL_HOT_BOOST = 8
+    # re: 模式每批取出并确认的候选数
+    REGEX_BATCH = 2000
+    # 分片化之前的单库索引：升级后导入各分片再删除
+    LEGACY_DB_PATH = str(Path.home() / ".mac_search_index.db")
+
+    # 后台维护（WAL 检查点 / 增量 vacuum / ANALYZE）的检查间隔，以及距上次搜索至少空闲多久才执行
+    MAINTENANCE_INTERVAL = 30
+    MAINTENANCE_MIN_IDLE = 5
+
+    def __init__(self, search_paths, shard_dir=None, show_hidden=False, content_index=False,
+                 files_per_sec=0, exclude_rules="", pinned_paths=()):
         self.search_paths = [str(Path(p).expanduser()) for p in search_paths]
-        self.db_path = db_path or str(Path.home() / ".mac_search_index.db")
+        # 每个搜索根目录一个分片数据库，增删根目录只需建立/删除对应文件
+        self.shard_dir = shard_dir or str(Path.home() / ".mac_search_shards")
         self.show_hidden = show_hidden
+        self.exclude_rules = exclude_rules
+        self._rules = self._compile_rules(show_hidden, exclude_rules)
+        # 重建时优先扫描的目录（如桌面、文稿）
+        self.pinned_paths = [str(Path(p).expanduser()).rstrip(os.sep) for p in pinned_paths]
         self.search_depth = 100
-        
-        # 数据库与线程锁
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        self.lock = threading.Lock()
-        
+        # 重建限速（文件/秒，0 表示不限）、前台状态、进度回调与停止信号
+        self.files_per_sec = files_per_sec
+        self._foreground = False
+        self.progress_cb = None
+        self._rebuild_stop = threading.Event()
+        # 首次建立、尚未爬取完成或尚未完成表结构升级的根目录：搜索结果可能不完整
+        self._partial_roots = set()
+        os.makedirs(self.shard_dir, exist_ok=True)
+
+        # root -> IndexShard；整体替换而不原地修改，监听线程读取时无需加锁
+        self.shards = {p: self._open_shard(p) for p in dict.fromkeys(self.search_paths)}
+        self._drop_orphan_shards()
+        self._partial_roots.update(r for r, s in self.shards.items() if s.needs_migration())
+        # 分片并行查询线程池（sqlite3 执行时会释放 GIL）
+        self._query_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="shard-query")
+        # 打开记录要写分片，可能等写锁（重建、实时更新批次），放到单独的单线程队列里按顺序写入
+        self._open_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="record-open")
+
         self._observer = None
+        self._handler = None
+        self._watches = {}
         self._is_monitoring = False
-        self._init_db()
-
-    def _init_db(self):
-        with self.lock:
-            cursor = self.conn.cursor()
-            # 开启 WAL 模式可以显著提高并发读写性能
-            cursor.execute('PRAGMA journal_mode=WAL')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS file_index (
-                    path TEXT PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    mtime REAL NOT NULL,
-                    size INTEGER NOT NULL
-                )
-            ''')
-            # 建立索引：加快模糊搜索速度
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_name ON file_index(name)')
-            self.conn.commit()
-
-    def _batch_insert(self, batch):
-        """核心优化：批量写入数据"""
+        # 可选的监听事件录制（见 event_trace.py），用于离线复现事件风暴
+        self.trace = None
+        # 常驻查询：(编译好的条件, 文件名正则, 回调)，每批写入提交后只把增量推送给界面
+        self._standing = None
+
+        # 可选的全文内容索引（独立数据库文件，后台进程池增量提取）
+        # 这里只打开数据库，按文件表补齐内容要读取全部分片，由调用方在后台线程执行 sync_content()
+        self.content = ContentIndexer() if content_index else None
+
+        # 正在进行的查询数与最近一次查询时间：维护任务只在没有查询时执行
+        self._search_lock = threading.Lock()
+        self._active_searches = 0
+        self._last_search_at = 0.0
+        self._maint_stop = threading.Event()
+        self._maint_thread = threading.Thread(target=self._maintenance_loop, daemon=True)
+        self._maint_thread.start()
+
+    def _shard_path(self, root):
+        return os.path.join(self.shard_dir, hashlib.sha1(root.encode('utf-8')).hexdigest()[:16] + '.db')
+
+    def _open_shard(self, root):
+        shard = IndexShard(root, self._shard_path(root))
+        shard.on_commit = self._on_shard_commit
+        return shard
+
+    def _drop_orphan_shards(self):
+        """清理不再对应任何搜索根目录的分片文件"""
+        keep = {os.path.basename(s.db_path) for s in self.shards.values()}
+        for fn in os.listdir(self.shard_dir):
+            if fn.endswith('.db') and fn not in keep:
+                for suffix in ('', '-wal', '-shm'):
+                    try:
+                        os.remove(os.path.join(self.shard_dir, fn + suffix))
+                    except OSError:
+                        pass
+
+    def _shard_for(self, path):
+        """文件归属于包含它的最深的根目录（嵌套根目录各自独立成片，互不重复）"""
+        best = None
+        for root, shard in self.shards.items():
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                if best is None or len(root) > len(best.root):
+                    best = shard
+        return best
+
+    def set_content_index(self, enabled):
+        """开启/关闭内容索引；开启时按当前文件表补齐内容，耗时与文件数成正比，应在后台线程调用"""
+        if enabled and self.content is None:
+            self.content = ContentIndexer()
+            self.sync_content()
+        elif not enabled and self.content is not None:
+            self.content.close()
+            self.content = None
+
+    def sync_content(self):
+        """按各分片的文件表清理/补齐内容索引，逐个分片报告读取进度"""
+        if not self.content: return
+        rows = []
+        for shard in list(self.shards.values()):
+            if self.progress_cb is not None:
+                try:
+                    self.progress_cb({"stage": "content", "root": shard.root, "files": len(rows)})
+                except Exception:
+                    pass
+            rows.extend(shard.all_rows())
+        self.content.sync(rows)
+
+    def _make_row(self, path, name, mtime, size):
+        """索引时一次性计算拼音全拼/首字母与小写后缀，查询时无需任何转换"""
+        return (path, name, mtime, size, *pinyin_keys(name), file_ext(name))
+
+    def _batch_insert(self, shard, batch, conn=None):
+        """核心优化：批量写入数据（行由 _make_row 生成）；传入 conn 时写入影子库"""
         if not batch: return
         try:
-            with self.lock:
-                cursor = self.conn.cursor()
-                cursor.executemany('''
-                    INSERT OR REPLACE INTO file_index (path, name, mtime, size) 
-                    VALUES (?, ?, ?, ?)
-                ''', batch)
-                self.conn.commit()
+            shard.insert_batch(batch, conn)
         except Exception as e:
             print(f"[IndexManager] 批量写入失败: {e}")
 
+    def _nested_roots(self, root_path):
+        """root_path 之下的其他根目录，留给它们自己的分片"""
+        prefix = root_path.rstrip(os.sep) + os.sep
+        return {r for r in self.shards if r != root_path and r.startswith(prefix)}
+
+    def _compile_rules(self, show_hidden, exclude_rules):
+        """把“显示隐藏文件”与排除规则编译为 (show_hidden, 名称通配符, 路径通配符)。
+        规则以逗号/分号/换行分隔：含 / 的按完整路径匹配（支持 ~），否则匹配任意一级文件或目录名"""
+        name_pats, path_pats = [], []
+        for rule in re.split(r'[,;\n]', exclude_rules or ''):
+            rule = rule.strip()
+            if not rule: continue
+            if '/' in rule:
+                path_pats.append(os.path.expanduser(rule).rstrip('/').lower())
+            else:
+                name_pats.append(rule.lower())
+        return bool(show_hidden), tuple(name_pats), tuple(path_pats)
+
+    def _file_excluded(self, name, path, rules):
+        show_hidden, name_pats, path_pats = rules
+        if not show_hidden and name.startswith('.'):
+            return True
+        low = name.lower()
+        if any(fnmatchcase(low, p) for p in name_pats):
+            return True
+        if path_pats:
+            low_path = path.lower()
+            return any(fnmatchcase(low_path, p) for p in path_pats)
+        return False
+
+    def _dir_excluded(self, name, path, rules):
+        return name in self.IGNORED_DIRS or self._file_excluded(name, path, rules)
+
+    def _should_index(self, path, rules=None):
+        """按规则判断单个文件是否应在索引中（监听事件与定向清理使用）"""
+        rules = rules or self._rules
+        shard = self._shard_for(path)
+        if shard is None: return False
+        rel = os.path.relpath(path, shard.root)
+        parts = rel.split(os.sep)
+        if len(parts) - 1 >= self.search_depth:
+            return False
+        cur = shard.root
+        for part in parts[:-1]:
+            cur = os.path.join(cur, part)
+            if self._dir_excluded(part, cur, rules):
+                return False
+        return not self._file_excluded(parts[-1], path, rules)
+
+    def _scan_dir(self, dir_path, depth, nested):
+        """扫描单个目录，返回 (文件行列表, 需要继续访问的子目录列表)"""
+        rows, subdirs = [], []
+        try:
+            with os.scandir(dir_path) as it:
+                entries = list(it)
+        except OSError:
+            return rows, subdirs
+        rules = self._rules
+        for entry in entries:
+            name = entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    # 过滤忽略/排除目录 + 深度控制
+                    if (not self._dir_excluded(name, entry.path, rules) and entry.path not in nested
+                            and depth + 1 < self.search_depth):
+                        subdirs.append(entry.path)
+                elif entry.is_file():
+                    if self._file_excluded(name, entry.path, rules):
+                        continue
+                    st = entry.stat()
+                    rows.append(self._make_row(entry.path, name, st.st_mtime, st.st_size))
+            except OSError:
+                continue
+        # 排序使插入顺序接近主键顺序
+        subdirs.sort()
+        return rows, subdirs
+
+    def _crawl(self, root_path, batch_size=5000):
+        """遍历一个根目录，按批产出 _make_row 行（不做检查点，用于小范围补扫）"""
+        nested = self._nested_roots(root_path)
+        stack, batch = [(root_path, 0)], []
+        while stack:
+            dir_path, depth = stack.pop()
+            rows, subdirs = self._scan_dir(dir_path, depth, nested)
+            batch.extend(rows)
+            stack.extend((p, depth + 1) for p in reversed(subdirs))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _set_background_io(self, enabled):
+        """macOS 上把当前线程切到后台 CPU/I/O 优先级（Python 3.12+ 才有这些常量），其他平台忽略"""
+        which = getattr(os, 'PRIO_DARWIN_THREAD', None)
+        bg = getattr(os, 'PRIO_DARWIN_BG', None)
+        if which is None or bg is None: return
+        try:
+            os.setpriority(which, 0, bg if enabled else 0)
+        except OSError:
+            pass
+
+    def set_foreground(self, active):
+        """搜索窗口显示时调用：重建降速并降低优先级，把磁盘让给搜索"""
+        self._foreground = active
+
+    def _rate_limit(self):
+        rate = self.files_per_sec
+        if self._foreground:
+            rate = min(rate, self.FOREGROUND_FILES_PER_SEC) if rate else self.FOREGROUND_FILES_PER_SEC
+        return rate
+
+    def _report_progress(self, shard, dirs, files, session_files, started, estimate, done=False):
+        if self.progress_cb is None: return
+        elapsed = max(time.monotonic() - started, 1e-6)
+        rate = session_files / elapsed
+        eta = None
+        if estimate and rate > 0 and files < estimate:
+            eta = (estimate - files) / rate
+        try:
+            self.progress_cb({
+                "root": shard.root, "dirs": dirs, "files": files,
+                "rate": rate, "eta": eta, "done": done, "partial": self.is_partial(),
+            })
+        except Exception:
+            pass
+
+    def _crawl_boosts(self, shard):
+        """(固定目录, 常打开文件所在目录及其上级目录)，用于计算爬取优先级"""
+        hot = set()
+        try:
+            dirs = shard.hot_dirs()
+        except Exception:
+            dirs = set()
+        root = shard.root.rstrip(os.sep)
+        for d in dirs:
+            while d.startswith(root) and d not in hot:
+                hot.add(d)
+                d = os.path.dirname(d)
+        return self.pinned_paths, hot
+
+    def _crawl_priority(self, dir_path, depth, boosts, now):
+        try:
+            age_days = max(0.0, now - os.stat(dir_path).st_mtime) / 86400
+        except OSError:
+            age_days = 0.0
+        prio = depth + self.CRAWL_AGE_WEIGHT * math.log2(1 + age_days)
+        pinned, hot = boosts
+        prefix = dir_path.rstrip(os.sep) + os.sep
+        # 固定目录的子树与通往固定目录的上级目录都提前，保证尽早走到固定目录
+        if any(dir_path == p or dir_path.startswith(p + os.sep) or p.startswith(prefix) for p in pinned):
+            prio -= self.CRAWL_PIN_BOOST
+        if dir_path in hot:
+            prio -= self.CRAWL_HOT_BOOST
+        return prio
+
+    def is_partial(self):
+        """是否有根目录仍在首次建立索引，搜索结果可能不完整"""
+        return bool(self._partial_roots)
+
+    def _build_shard(self, shard, fresh=True):
+        """带检查点的分片重建：定期把已扫描数据与待访问目录一起提交，
+        中途退出/休眠后可从检查点续建；按 files_per_sec 与前台状态限速。
+        待访问目录按 _crawl_priority 组成优先队列，常用位置先入索引；
+        首次建立（正式库为空）时每批同时写入正式库，爬取过程中即可搜索已扫描的部分"""
+        if not os.path.exists(shard.root):
+            if shard.has_pending_build():
+                conn, _, _ = shard.begin_build(fresh=False)
+                shard.abort_build(conn)
+            return False
+
+        conn, frontier, meta = shard.begin_build(fresh)
+        nested = self._nested_roots(shard.root)
+        dirs_done, files_done = meta.get('dirs', 0), meta.get('files', 0)
+        # 上一次完整索引的文件数，用来估算剩余时间
+        estimate = shard.count()
+        # 是否同时写入正式库：随检查点保存，续建时沿用
+        mirror = meta.get('mirror', int(estimate == 0))
+        if mirror:
+            estimate = 0
+            self._partial_roots.add(shard.root)
+        # 优先队列：(优先级, 入队序号, 目录, 深度)，序号保证同优先级按入队顺序
+        boosts, seq, wall = self._crawl_boosts(shard), count(), time.time()
+        frontier = [(self._crawl_priority(d, depth, boosts, wall), next(seq), d, depth) for d, depth in frontier]
+        heapq.heapify(frontier)
+
+        def save(batch):
+            if mirror:
+                self._batch_insert(shard, list(batch))
+            shard.checkpoint(conn, batch, [(d, depth) for _, _, d, depth in frontier],
+                             {'dirs': dirs_done, 'files': files_done, 'mirror': mirror})
+
+        started = last_ckpt = last_report = time.monotonic()
+        session_files, batch = 0, []
+        low_priority = None
+
+        try:
+            while frontier:
+                if self._rebuild_stop.is_set():
+                    save(batch)
+                    shard.suspend_build(conn)
+                    print(f"[IndexManager] 已暂停重建并保存检查点: {shard.root}")
+                    return False
+
+                if low_priority != self._foreground:
+                    low_priority = self._foreground
+                    self._set_background_io(low_priority)
+
+                t0 = time.monotonic()
+                _, _, dir_path, depth = heapq.heappop(frontier)
+                rows, subdirs = self._scan_dir(dir_path, depth, nested)
+                batch.extend(rows)
+                wall = time.time()
+                for p in subdirs:
+                    heapq.heappush(frontier, (self._crawl_priority(p, depth + 1, boosts, wall), next(seq), p, depth + 1))
+                dirs_done += 1
+                files_done += len(rows)
+                session_files += len(rows)
+
+                now = time.monotonic()
+                if len(batch) >= self.CHECKPOINT_FILES or now - last_ckpt >= self.CHECKPOINT_SECS:
+                    save(batch)
+                    batch = []
+                    last_ckpt = now
+                if now - last_report >= 0.5:
+                    self._report_progress(shard, dirs_done, files_done, session_files, started, estimate)
+                    last_report = now
+
+                # 限速：按本目录的文件数补足应耗时间
+                rate = self._rate_limit()
+                if rate and rows:
+                    delay = len(rows) / rate - (time.monotonic() - t0)
+                    if delay > 0:
+                        self._rebuild_stop.wait(delay)
+
+            save(batch)
+            ok = shard.finish_build(conn)
+            self._partial_roots.discard(shard.root)
+            self._report_progress(shard, dirs_done, files_done, session_files, started, estimate, done=True)
+            return ok
+        except Exception as e:
+            print(f"[IndexManager] 重建分片失败 {shard.root}: {e}")
+            shard.abort_build(conn)
+            self._partial_roots.discard(shard.root)
+            return False
+        finally:
+            if low_priority:
+                self._set_background_io(False)
+
     def rebuild_index(self):
-        """全量重建索引"""
+        """全量重建索引：每个分片在各自的影子库中构建并原子替换，期间搜索继续使用旧索引"""
         print("开始重建索引...")
-        with self.lock:
-            self.conn.execute('DELETE FROM file_index')
-            self.conn.commit()
-        
-        for root_path in self.search_paths:
-            if not os.path.exists(root_path): continue
-            
-            batch = []
-            for root, dirs, files in os.walk(root_path, topdown=True):
-                # 1. 过滤忽略目录
-                dirs[:] = [d for d in dirs if d not in self.IGNORED_DIRS and 
-                          (self.show_hidden or not d.startswith('.'))]
-                
-                # 2. 深度控制
-                depth = root[len(root_path):].count(os.sep)
-                if depth >= self.search_depth:
-                    dirs[:] = []
-                    continue
+        self._rebuild_stop.clear()
+        # 先为所有分片写好初始检查点：中途退出后，尚未开始的分片也会在下次启动时续建
+        for shard in list(self.shards.values()):
+            if os.path.exists(shard.root):
+                conn, _, _ = shard.begin_build(fresh=True)
+                shard.suspend_build(conn)
+        self.resume_rebuild()
 
-                for f in files:
-                    if not self.show_hidden and f.startswith('.'):
-                        continue
-                    
-                    fp = os.path.join(root, f)
-                    try:
-                        st = os.stat(fp)
-                        batch.append((fp, f, st.st_mtime, st.st_size))
-                        
-                        # 每 1000 个文件提交一次事务
-                        if len(batch) >= 1000:
-                            self._batch_insert(batch)
-                            batch = []
-                    except (PermissionError, FileNotFoundError):
-                        continue
-            
-            # 提交剩余部分
-            self._batch_insert(batch)
+    def has_pending_rebuild(self):
+        return any(s.has_pending_build() for s in self.shards.values())
+
+    def needs_initial_build(self):
+        """首次启动：所有分片都为空且没有未完成的重建，需要立即开始建立索引"""
+        return (not self.has_pending_rebuild()
+                and all(s.count() == 0 for s in self.shards.values()))
+
+    def needs_migration(self):
+        return any(s.needs_migration() for s in self.shards.values())
+
+    def migrate_shards(self):
+        """升级旧版本分片（回填新增列、建立索引），在索引任务线程执行，逐个分片报告进度"""
+        for shard in list(self.shards.values()):
+            if not shard.needs_migration(): continue
+            if self.progress_cb is not None:
+                try:
+                    self.progress_cb({"stage": "migrate", "root": shard.root, "files": shard.count()})
+                except Exception:
+                    pass
+            try:
+                shard.migrate()
+            except Exception as e:
+                print(f"[IndexManager] {shard.root} 升级失败: {e}")
+                continue
+            self._partial_roots.discard(shard.root)
+
+    def has_legacy_index(self):
+        return os.path.exists(self.LEGACY_DB_PATH)
+
+    def import_legacy_index(self, batch_size=5000):
+        """把旧版单库索引导入仍为空的分片，升级后立即可搜（过期条目由随后的重建校正），然后删除旧库"""
+        targets = {root for root, shard in self.shards.items() if shard.count() == 0}
+        imported = 0
+        conn = None
+        try:
+            conn = sqlite3.connect(f'file:{self.LEGACY_DB_PATH}?mode=ro', uri=True)
+            cursor = conn.execute('SELECT path, name, mtime, size FROM file_index')
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows: break
+                by_shard = {}
+                for path, name, mtime, size in rows:
+                    shard = self._shard_for(path)
+                    if shard is not None and shard.root in targets and self._should_index(path):
+                        by_shard.setdefault(shard, []).append(self._make_row(path, name, mtime, size))
+                for shard, batch in by_shard.items():
+                    self._batch_insert(shard, batch)
+                    imported += len(batch)
+        except sqlite3.Error as e:
+            print(f"[IndexManager] 旧版索引无法读取，跳过导入: {e}")
+        finally:
+            if conn is not None: conn.close()
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(self.LEGACY_DB_PATH + suffix)
+            except OSError:
+                pass
+        print(f"[IndexManager] 已从旧版索引导入 {imported} 条")
+        return imported
+
+    def resume_rebuild(self):
+        """从检查点续建所有未完成的分片"""
+        self._rebuild_stop.clear()
+        # 首次建立的分片在轮到自己之前也是不完整的
+        self._partial_roots.update(s.root for s in self.shards.values() if s.has_pending_build() and s.count() == 0)
+        for shard in list(self.shards.values()):
+            if self._rebuild_stop.is_set():
+                return
+            if shard.has_pending_build():
+                self._build_shard(shard, fresh=False)
+        if self._rebuild_stop.is_set():
+            return
+
+        self.sync_content()
         print("索引重建完成！")
 
+    def stop_rebuild(self):
+        """请求正在进行的重建在下一个目录边界保存检查点并退出"""
+        self._rebuild_stop.set()
+
+    def add_root(self, root):
+        """新增搜索根目录：只建立并扫描这一个分片"""
+        root = str(Path(root).expanduser())
+        if root in self.shards: return
+        shard = self._open_shard(root)
+        self.shards = {**self.shards, root: shard}
+        self.search_paths = list(self.shards)
+        # 父分片中已有的这棵子树移交给新分片
+        prefix = root.rstrip(os.sep) + os.sep
+        for other in self.shards.values():
+            if other is not shard and prefix.startswith(other.root.rstrip(os.sep) + os.sep):
+                other.delete_prefix(prefix)
+        self._build_shard(shard)
+        if self._observer is not None and os.path.exists(root):
+            self._watches[root] = self._observer.schedule(self._handler, root, recursive=True)
+        self.sync_content()
+        print(f"[IndexManager] 已添加分片: {root}")
+
+    def remove_root(self, root):
+        """移除搜索根目录：删除分片文件；若仍被其他根目录包含，则把这棵子树补回父分片"""
+        root = str(Path(root).expanduser())
+        shard = self.shards.get(root)
+        if shard is None: return
+        self.shards = {r: s for r, s in self.shards.items() if r != root}
+        self.search_paths = list(self.shards)
+        self._partial_roots.discard(root)
+        watch = self._watches.pop(root, None)
+        if watch is not None and self._observer is not None:
+            self._observer.unschedule(watch)
+        shard.drop()
+
+        parent = self._shard_for(root)
+        if parent is not None and os.path.exists(root):
+            for batch in self._crawl(root):
+                self._batch_insert(parent, batch)
+        self.sync_content()
+        print(f"[IndexManager] 已移除分片: {root}")
+
+    def set_search_paths(self, paths):
+        """按差异增删分片，而不是全量重建"""
+        paths = [str(Path(p).expanduser()) for p in paths]
+        for root in [r for r in self.shards if r not in paths]:
+            self.remove_root(root)
+        for root in paths:
+            if root not in self.shards:
+                self.add_root(root)
+
+    def apply_config_diff(self, diff):
+        """按 ConfigManager.diff 的结果增量更新索引，而不是全量重建：
+        移除的根目录直接删分片；显示隐藏/排除规则变化做定向清理与补扫；新增的根目录只扫描自己"""
+        for root in diff.get("removed_paths", []):
+            self.remove_root(root)
+
+        if "show_hidden" in diff or "exclude_rules" in diff:
+            old_rules = self._rules
+            self.show_hidden = diff.get("show_hidden", self.show_hidden)
+            self.exclude_rules = diff.get("exclude_rules", self.exclude_rules)
+            self._rules = self._compile_rules(self.show_hidden, self.exclude_rules)
+            self._apply_rule_change(old_rules, self._rules)
+
+        if "pinned_paths" in diff:
+            self.pinned_paths = [str(Path(p).expanduser()).rstrip(os.sep) for p in diff["pinned_paths"] or []]
+
+        for root in diff.get("added_paths", []):
+            self.add_root(root)
+
+    def _apply_rule_change(self, old, new):
+        # 变严格（关闭隐藏文件 / 新增排除规则）需要清理，变宽松（开启隐藏文件 / 删除排除规则）需要补扫
+        stricter = (old[0] and not new[0]) or set(new[1]) - set(old[1]) or set(new[2]) - set(old[2])
+        looser = (new[0] and not old[0]) or set(old[1]) - set(new[1]) or set(old[2]) - set(new[2])
+        for shard in list(self.shards.values()):
+            if stricter:
+                self._purge_pass(shard)
+            if looser:
+                self._add_pass(shard, old)
+        self.sync_content()
+
+    def _purge_pass(self, shard):
+        """定向清理：只遍历索引中的路径，删除按新规则不应收录的条目，不访问磁盘"""
+        doomed = [(p,) for p, _, _ in shard.all_rows() if not self._should_index(p)]
+        shard.delete_many(doomed)
+        print(f"[IndexManager] {shard.root} 清理 {len(doomed)} 条")
+
+    def _add_pass(self, shard, old_rules):
+        """定向补扫：遍历目录结构，只对按旧规则被排除、按新规则应收录的文件 stat 并写入"""
+        if not os.path.exists(shard.root): return
+        rules = self._rules
+        nested = self._nested_roots(shard.root)
+        # (目录, 深度, 该目录在旧规则下是否已被收录)
+        stack, batch, added = [(shard.root, 0, True)], [], 0
+        while stack:
+            dir_path, depth, old_ok = stack.pop()
+            try:
+                with os.scandir(dir_path) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                name, path = entry.name, entry.path
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if (not self._dir_excluded(name, path, rules) and path not in nested
+                                and depth + 1 < self.search_depth):
+                            stack.append((path, depth + 1, old_ok and not self._dir_excluded(name, path, old_rules)))
+                    elif entry.is_file():
+                        if self._file_excluded(name, path, rules):
+                            continue
+                        if old_ok and not self._file_excluded(name, path, old_rules):
+                            continue  # 旧规则下已收录
+                        st = entry.stat()
+                        batch.append(self._make_row(path, name, st.st_mtime, st.st_size))
+                except OSError:
+                    continue
+            if len(batch) >= 5000:
+                self._batch_insert(shard, batch)
+                added += len(batch)
+                batch = []
+        self._batch_insert(shard, batch)
+        print(f"[IndexManager] {shard.root} 补扫 {added + len(batch)} 条")
+
+    def set_standing_query(self, search_mgr, callback):
+        """登记当前界面上的查询。之后每批写入提交后，用同一套 SQL 条件只检查这批变动的路径，
+        回调 callback(新增或更新的记录, 移除的路径, 移除的目录前缀, 是否需要整体刷新)。
+        回调在写入线程中执行，界面端应通过 Qt 信号转回主线程"""
+        filters = self.compile_filters(search_mgr)
+        if filters[3] != 'file_index':
+            self._standing = None
+            return
+        self._standing = (filters, search_mgr.name_regex, callback)
+
+    def clear_standing_query(self):
+        self._standing = None
+
+    def _on_shard_commit(self, shard, upserted, removed, prefixes, reset):
+        standing = self._standing
+        if standing is None: return
+        (where, params, scope, _, _), regex, callback = standing
+        if reset:
+            callback([], [], [], True)
+            return
+        matched = []
+        if upserted and (not scope or scope_roots([shard.root], *scope)):
+            try:
+                matched = shard.match_paths(upserted, where, params)
+            except Exception as e:
+                print(f"[IndexManager] 常驻查询匹配失败: {e}")
+            if regex is not None:
+                matched = [r for r in matched if regex.search(r.name)]
+        hit = {r.path for r in matched}
+        # 写入了但不再匹配的路径（例如被改名、大小超出范围）也要从界面移除
+        gone = removed + [p for p in upserted if p not in hit]
+        if matched or gone or prefixes:
+            callback(matched, gone, prefixes, False)
+
+    def shard_stats(self):
+        """各分片的文件数、占用空间（主库/WAL/空闲页）与查询耗时"""
+        return [{
+            "root": s.root,
+            "files": s.count(),
+            "bytes": s.size_bytes(),
+            "last_query_ms": s.last_query_ms,
+            "avg_query_ms": s.avg_query_ms,
+            **s.db_stats(),
+        } for s in self.shards.values()]
+
+    def _maintenance_loop(self):
+        while not self._maint_stop.wait(self.MAINTENANCE_INTERVAL):
+            self.run_maintenance()
+
+    def _maintenance_busy(self):
+        """有查询进行中或刚结束：维护让路。分片在每个维护步骤之前都会重新检查"""
+        return self._active_searches > 0 or time.time() - self._last_search_at < self.MAINTENANCE_MIN_IDLE
+
+    def run_maintenance(self):
+        """对各分片执行一轮维护；每个分片、每个维护步骤开始前都重新确认当前没有查询"""
+        for shard in list(self.shards.values()):
+            if self._maintenance_busy():
+                return
+            try:
+                done = shard.maintain(time.time() - self._last_search_at, self._maintenance_busy)
+            except Exception as e:
+                print(f"[IndexManager] {shard.root} 维护失败: {e}")
+                continue
+            if done:
+                print(f"[IndexManager] {shard.root} 维护: {', '.join(done)}")
+
     def start_monitoring(self):
         """启动监听，增加严格的单例保护"""
         if self._is_monitoring or self._observer is not None:
             print("[IndexManager] 监控已在运行中，跳过重复启动")
             return
         
-        # 内部类定义保持不变...
-        class FileChangeHandler(FileSystemEventHandler):
-            def __init__(self, mgr): self.mgr = mgr
-            def _is_ignored(self, path):
-                parts = Path(path).parts
-                return any(p in self.mgr.IGNORED_DIRS for p in parts)
-            def on_created(self, event):
-                if not event.is_directory and not self._is_ignored(event.src_path):
-                    self.mgr._update_file_async(event.src_path)
-            def on_modified(self, event):
-                if not event.is_directory and not self._is_ignored(event.src_path):
-                    self.mgr._update_file_async(event.src_path)
-            def on_deleted(self, event):
-                if not event.is_directory: self.mgr.remove_file(event.src_path)
-            def on_moved(self, event):
-                if not event.is_directory:
-                    self.mgr.remove_file(event.src_path)
-                    if not self._is_ignored(event.dest_path):
-                        self.mgr._update_file_async(event.dest_path)
-
         try:
             self._observer = Observer()
-            handler = FileChangeHandler(self)
+            self._handler = FileChangeHandler(self)
+            self._watches = {}
             for path in self.search_paths:
                 if os.path.exists(path):
                     # 确保只 schedule 一次
-                    self._observer.schedule(handler, path, recursive=True)
+                    self._watches[path] = self._observer.schedule(self._handler, path, recursive=True)
             self._observer.start()
             self._is_monitoring = True
             print(f"[IndexManager] 成功启动监控: {self.search_paths}")
@@ -142,35 +757,306 @@ class IndexManager:
 
     def _update_file_async(self, file_path):
         """单文件增量更新"""
+        shard = self._shard_for(file_path)
+        if shard is None: return
+        shard.note_change(file_path, True)
         try:
             st = os.stat(file_path)
-            with self.lock:
-                self.conn.execute('''
-                    INSERT OR REPLACE INTO file_index (path, name, mtime, size) 
-                    VALUES (?, ?, ?, ?)
-                ''', (file_path, os.path.basename(file_path), st.st_mtime, st.st_size))
-                self.conn.commit()
+            shard.insert_batch([self._make_row(file_path, os.path.basename(file_path), st.st_mtime, st.st_size)])
+            if self.content:
+                self.content.enqueue([(file_path, st.st_mtime, st.st_size)])
         except: pass
 
     def remove_file(self, file_path):
-        with self.lock:
-            self.conn.execute('DELETE FROM file_index WHERE path = ?', (file_path,))
-            self.conn.commit()
-
-    def search_name(self, query, max_results=1000):
-        if not query: return []
-        with self.lock:
-            cursor = self.conn.cursor()
-            # 关键：在数据库层面先进行降序排列
-            cursor.execute('''
-                SELECT path, name, mtime, size FROM file_index 
-                WHERE name LIKE ? 
-                ORDER BY mtime DESC 
-                LIMIT ?
-            ''', (f'%{query}%', max_results))
-            return [{"path": r[0], "name": r[1], "mtime": r[2], "size": r[3]} for r in cursor.fetchall()]
+        shard = self._shard_for(file_path)
+        if shard is not None:
+            shard.note_change(file_path, False)
+            shard.delete(file_path)
+        if self.content:
+            self.content.remove(file_path)
+
+    def record_open_async(self, path):
+        """供界面线程调用：立即返回，由后台线程执行 record_open"""
+        self._open_pool.submit(self.record_open, path)
+
+    def record_open(self, path):
+        """用户通过结果列表打开/定位了文件，提升其常用度"""
+        shard = self._shard_for(path)
+        if shard is None: return
+        try:
+            shard.record_open(path)
+        except Exception as e:
+            print(f"[IndexManager] 记录打开失败: {e}")
+
+    def remove_dir(self, dir_path):
+        """目录被删除/移走：按主键前缀删除整棵子树，目录汇总一并扣除"""
+        shard = self._shard_for(dir_path)
+        if shard is None or dir_path == shard.root: return
+        prefix = dir_path.rstrip(os.sep) + os.sep
+        shard.delete_prefix(prefix)
+        if self.content:
+            self.content.remove_prefix(prefix)
+
+    def add_dir(self, dir_path):
+        """目录被移入：扫描这棵子树写入所属分片，文本文件同时排入内容索引"""
+        shard = self._shard_for(dir_path)
+        if shard is None or not self._should_index(os.path.join(dir_path, '_')): return
+        for batch in self._crawl(dir_path):
+            self._batch_insert(shard, batch)
+            if self.content:
+                self.content.enqueue((row[0], row[2], row[3]) for row in batch)
+
+    def search_name(self, query, max_results=1000, sort='frecency', after=None):
+        """单关键词模糊匹配，默认常用文件优先、其次按修改时间；
+        关键词为空时返回常用/最近修改的文件（覆盖索引扫描）"""
+        where, params = self._keyword_clause(query) if query else ('1', [])
+        return self.search((where, params, None, 'file_index', ()), max_results, sort, after)
+
+    def top_folders(self, sort='size', max_results=50):
+        """最大的目录（sort='size'）/ 最近活跃的目录（sort='mtime'），直接读目录汇总表"""
+        return self.search(('1', [], None, 'dir_stats', ()), max_results, sort)
+
+    def _keyword_clause(self, kw):
+        """单个关键词的匹配条件：文件名子串，拼音输入时同时匹配全拼/首字母列"""
+        pattern = f'%{like_escape(kw)}%'
+        if is_pinyin_query(kw):
+            return f'(name {LIKE} OR py_full {LIKE} OR py_initials {LIKE})', [pattern] * 3
+        return f'name {LIKE}', [pattern]
+
+    def _order_clause(self, sort, after):
+        """生成排序子句与 keyset 翻页条件，例如 (mtime, path) < (?, ?)"""
+        keys, desc = self.SORT_MODES.get(sort, self.SORT_MODES['mtime'])
+        direction = 'DESC' if desc else 'ASC'
+        order = ', '.join(f'{k} {direction}' for k in keys)
+        if after is None:
+            return '', [], order
+        op = '<' if desc else '>'
+        cond = f"({', '.join(keys)}) {op} ({', '.join('?' * len(keys))})"
+        return cond, [getattr(after, k) for k in keys], order
+
+    def search(self, filters, max_results=1000, sort='mtime', after=None, cancelled=None):
+        """按编译好的过滤条件查询一页结果；after 为上一页最后一条记录。
+        各分片并行查询后按排序键做 top-k 归并。cancelled 为可调用对象，
+        返回 True 时正在执行的 SQL 会被立即中止并返回空列表"""
+        with self._searching():
+            return self._search(filters, max_results, sort, after, cancelled)
+
+    @contextmanager
+    def _searching(self):
+        with self._search_lock:
+            self._active_searches += 1
+        try:
+            yield
+        finally:
+            with self._search_lock:
+                self._active_searches -= 1
+                self._last_search_at = time.time()
+
+    def _search(self, filters, max_results, sort, after, cancelled):
+        where, params, scope, table, probes = filters
+        if table == 'dir_stats' and sort == 'frecency':
+            # 目录没有打开记录，常用度排序退化为最近活跃
+            sort = 'mtime'
+        cond, cond_params, order = self._order_clause(sort, after)
+        if cond:
+            where = f'{where} AND {cond}'
+            params = [*params, *cond_params]
+
+        shards = list(self.shards.values())
+        if scope:
+            # in:/!in: 限定时跳过与范围不相交的分片
+            shards = [s for s in shards if scope_roots([s.root], *scope)]
+        if not shards: return []
+        if len(shards) == 1:
+            return shards[0].search(where, params, order, max_results, cancelled, table, probes)
+
+        futures = [self._query_pool.submit(s.search, where, params, order, max_results, cancelled, table, probes)
+                   for s in shards]
+        pages = [f.result() for f in futures]
+        if cancelled is not None and cancelled():
+            return []
+
+        keys, desc = self.SORT_MODES.get(sort, self.SORT_MODES['mtime'])
+        key = attrgetter(*keys)
+        return list(islice(heapq.merge(*pages, key=key, reverse=desc), max_results))
+
+    def compile_filters(self, search_mgr):
+        """把 SearchManager 的条件编译为 (WHERE 片段, 参数, 路径范围, 表名, 可走索引的条件)，交给 SQLite 过滤；
+        kind:dir 时查询目录汇总表 dir_stats，其列名与 file_index 一致。
+        可走索引的条件为 [(列, 条件, 参数)]，足够窄时分片改走该列的索引（见 IndexShard._pick_index）"""
+        clauses, params = [], []
+        for kw in search_mgr.and_kws:
+            clause, p = self._keyword_clause(kw)
+            clauses.append(clause)
+            params.extend(p)
+        if search_mgr.or_kws:
+            parts = [self._keyword_clause(kw) for kw in search_mgr.or_kws]
+            clauses.append('(' + ' OR '.join(c for c, _ in parts) + ')')
+            for _, p in parts:
+                params.extend(p)
+        if search_mgr.exact_exts:
+            clauses.append('(' + ' OR '.join([f'name {LIKE}'] * len(search_mgr.exact_exts)) + ')')
+            params.extend(f'%{like_escape(ext)}' for ext in search_mgr.exact_exts)
+        for kw in search_mgr.not_kws:
+            clauses.append(f'name NOT {LIKE}')
+            params.append(f'%{like_escape(kw)}%')
+        for ext in search_mgr.not_exts:
+            clauses.append(f'name NOT {LIKE}')
+            params.append(f'%{like_escape(ext)}')
+        # size/mtime 区间落在覆盖索引的键上
+        probes = []
+        for col, ranges in (('size', search_mgr.size_ranges), ('mtime', search_mgr.mtime_ranges)):
+            for lo, hi in ranges:
+                conds, p = [], []
+                if lo is not None:
+                    conds.append(f'{col} >= ?')
+                    p.append(lo)
+                if hi is not None:
+                    conds.append(f'{col} < ?')
+                    p.append(hi)
+                if conds:
+                    clauses.extend(conds)
+                    params.extend(p)
+                    probes.append((col, ' AND '.join(conds), tuple(p)))
+        # kind 展开为后缀组：WHERE 中按文件名结尾匹配（排序覆盖索引上即可判断，无需回表）；
+        # 全部是单级后缀时再给出等价的 ext IN 条件，命中少时分片改走 ext 索引
+        if search_mgr.kind_exts:
+            exts = list(dict.fromkeys(search_mgr.kind_exts))
+            clauses.append('(' + ' OR '.join([f'name {LIKE}'] * len(exts)) + ')')
+            params.extend(f'%{like_escape(ext)}' for ext in exts)
+            if all(ext.count('.') == 1 for ext in exts):
+                probes.append(('ext', f"ext IN ({', '.join('?' * len(exts))})", tuple(exts)))
+        # re: 先用正则中必然出现的片段在 SQL 中粗筛，正则本身在 search_regex 中确认
+        if search_mgr.name_pattern:
+            clause, p = self._literal_clause(required_literals(search_mgr.name_pattern))
+            if clause:
+                clauses.append(clause)
+                params.extend(p)
+        # in:/!in: 编译为主键 path 上的前缀区间，查询代价与子树大小成正比
+        if search_mgr.in_paths:
+            clauses.append('(' + ' OR '.join(['(path > ? AND path < ?)'] * len(search_mgr.in_paths)) + ')')
+            for p in search_mgr.in_paths:
+                prefix = p.rstrip('/') + '/'
+                params.extend((prefix, prefix + PREFIX_END))
+        for p in search_mgr.not_in_paths:
+            prefix = p.rstrip('/') + '/'
+            clauses.append('NOT (path > ? AND path < ?)')
+            params.extend((prefix, prefix + PREFIX_END))
+        scope = (search_mgr.in_paths, search_mgr.not_in_paths) if search_mgr.in_paths or search_mgr.not_in_paths else None
+        table = 'dir_stats' if search_mgr.kind_dirs else 'file_index'
+        return ' AND '.join(clauses) or '1', params, scope, table, tuple(probes)
+
+    def _literal_clause(self, terms):
+        """required_literals 的结果 -> name LIKE 组合"""
+        clauses, params = [], []
+        for term in terms:
+            if isinstance(term, str):
+                clauses.append(f'name {LIKE}')
+                params.append(f'%{like_escape(term)}%')
+            else:
+                alts = [self._literal_clause(alt) for alt in term[1]]
+                clauses.append('(' + ' OR '.join(f'({c})' for c, _ in alts) + ')')
+                for _, p in alts:
+                    params.extend(p)
+        return ' AND '.join(clauses), params
+
+    def search_regex(self, filters, regex, max_results=500, sort='mtime', after=None,
+                     cancelled=None, budget=1.5, on_batch=None):
+        """re: 模式：按排序顺序分批取出预过滤后的候选，用预编译正则确认。
+        返回 (结果, 游标)：游标不为 None 表示还有未扫描的候选（结果已满或超出时间预算），
+        可作为 after 继续下一页。on_batch 用于边确认边回传结果"""
+        deadline = time.perf_counter() + budget
+        hits = []
+        while True:
+            page = self.search(filters, self.REGEX_BATCH, sort, after, cancelled)
+            if cancelled is not None and cancelled():
+                return [], None
+            matched = [r for r in page if regex.search(r.name)]
+            room = max_results - len(hits)
+            if len(matched) >= room:
+                matched = matched[:room]
+                hits.extend(matched)
+                if on_batch and matched: on_batch(matched)
+                return hits, hits[-1] if hits else None
+            hits.extend(matched)
+            if on_batch and matched: on_batch(matched)
+            if len(page) < self.REGEX_BATCH:
+                return hits, None
+            after = page[-1]
+            if time.perf_counter() >= deadline:
+                return hits, after
+
+    def duplicate_candidates(self, filters, min_size=1, sizes_per_query=200, cancelled=None):
+        """查重第一步：按 size 分组，只有大小相同的文件才可能重复。
+        按大小从大到小逐个产出 [FileRecord, ...] 桶，优先处理可释放空间最多的文件；
+        cancelled() 返回 True 时中止正在执行的分组扫描，不再产出"""
+        with self._searching():
+            yield from self._duplicate_candidates(filters, min_size, sizes_per_query, cancelled)
+
+    def _duplicate_candidates(self, filters, min_size, sizes_per_query, cancelled):
+        where, params, scope, _, _ = filters
+        shards = list(self.shards.values())
+        if scope:
+            shards = [s for s in shards if scope_roots([s.root], *scope)]
+        if not shards: return
+        # 单分片直接 HAVING 过滤；多分片时同一大小可能分散在不同分片，需要先汇总计数
+        counts = {}
+        for shard in shards:
+            for size, n in shard.size_groups(where, params, min_size, len(shards) == 1, cancelled):
+                counts[size] = counts.get(size, 0) + n
+            if cancelled is not None and cancelled(): return
+        sizes = sorted((s for s, n in counts.items() if n > 1), reverse=True)
+        for i in range(0, len(sizes), sizes_per_query):
+            chunk = sizes[i:i + sizes_per_query]
+            buckets = {}
+            for shard in shards:
+                for rec in shard.rows_by_size(where, params, chunk, cancelled):
+                    buckets.setdefault(rec.size, []).append(rec)
+            if cancelled is not None and cancelled(): return
+            for size in chunk:
+                if len(buckets.get(size, ())) > 1:
+                    yield buckets[size]
+
+    def grep_candidates(self, filters, max_size, limit=20000, cancelled=None):
+        """为实时 grep 提供候选文件：先用文件名/后缀条件收窄，再按大小上限过滤；
+        cancelled() 返回 True 时中止查询，返回空列表"""
+        where, params, scope, _, probes = filters
+        records = self.search((f'{where} AND size > 0 AND size <= ?', [*params, max_size], scope, 'file_index',
+                               (*probes, ('size', 'size > 0 AND size <= ?', (max_size,)))), limit,
+                              cancelled=cancelled)
+        return [(r.path, r.name, r.mtime, r.size) for r in records]
+
+    def search_content(self, text, max_results=1000):
+        """全文内容检索，未开启内容索引时返回空"""
+        if not self.content: return []
+        return self.content.search(text, max_results)
+
     def stop_monitoring(self):
         if self._observer:
             self._observer.stop()
             self._observer.join()
-            self._is_monitoring = False
\ No newline at end of file
+            self._observer = None
+            self._watches = {}
+            self._is_monitoring = False
+
+    def start_trace(self, trace_path):
+        """开始把监听到的文件事件录制到 trace 文件（追加写入）"""
+        self.stop_trace()
+        self.trace = TraceRecorder(trace_path, self)
+        print(f"[IndexManager] 事件录制: {trace_path}")
+
+    def stop_trace(self):
+        trace, self.trace = self.trace, None
+        if trace is not None:
+            trace.close()
+
+    def close(self):
+        self._maint_stop.set()
+        self.stop_rebuild()
+        self.stop_monitoring()
+        self.stop_trace()
+        self.set_content_index(False)
+        self._query_pool.shutdown(wait=False)
+        self._open_pool.shutdown(wait=True)
+        for shard in self.shards.values():
+            shard.close()
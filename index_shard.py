@@ -0,0 +1,755 @@
+# index_shard.py
+import os
+import math
+import sqlite3
+import threading
+import time
+from file_record import FileRecord
+from pinyin_keys import pinyin_keys
+
+# 表结构版本：2 = 增加拼音全拼/首字母列；3 = 增加目录汇总表 dir_stats；4 = 增加常用度 frecency；
+# 5 = 增加小写后缀列 ext（kind: 过滤走索引）
+SCHEMA_VERSION = 5
+
+# 常用度按指数衰减：一次打开的权重每过一个半衰期减半。
+# 存储的是以固定纪元为基准的对数分数 log2(Σ 2^((t_i - 纪元) / 半衰期))，
+# 所有文件在任意时刻的真实分数都等于 2^(分数 - (当前 - 纪元) / 半衰期)，即同乘一个因子，
+# 因此按存储分数排序就等于按当前衰减后的分数排序：衰减在查询时隐式完成，表无需定期重写
+FRECENCY_EPOCH = 1704067200  # 2024-01-01
+FRECENCY_HALF_LIFE = 7 * 86400
+
+
+def file_ext(name):
+    """小写后缀（含点），如 Movie.MP4 -> .mp4；没有后缀时为空字符串"""
+    return os.path.splitext(name)[1].lower()
+
+
+class IndexShard:
+    """单个搜索根目录对应的分片数据库：独立的写连接/只读连接与影子库重建"""
+
+    def __init__(self, root, db_path):
+        self.root = root
+        self.db_path = db_path
+
+        # 数据库与线程锁
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        # 重建期间记录监听到的变动：path -> 是否存在，替换影子库后回放
+        self._rebuild_changes = None
+        self._init_db()
+
+        # 独立的只读连接：搜索不占用写锁，并可通过 progress_handler 中途取消
+        self.read_lock = threading.Lock()
+        self.read_conn = self._open_reader()
+
+        # 查询耗时统计（毫秒）
+        self.last_query_ms = 0.0
+        self.avg_query_ms = 0.0
+        # 上次 ANALYZE 以来写入/删除的行数，超过阈值时由维护任务重新收集统计信息
+        self.changes_since_analyze = 0
+        # 正式库每次提交写入后回调 on_commit(shard, 写入路径, 删除路径, 删除前缀, 是否整体替换)，
+        # 供 IndexManager 把变动推送给常驻查询
+        self.on_commit = None
+
+    def _init_db(self):
+        with self.lock:
+            cursor = self.conn.cursor()
+            # 新库使用增量 vacuum（只能在建表前设置；旧库在下次重建时随影子库切换过来）
+            cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            # 开启 WAL 模式可以显著提高并发读写性能
+            cursor.execute('PRAGMA journal_mode=WAL')
+            version = cursor.execute('PRAGMA user_version').fetchone()[0]
+            self._create_table(cursor)
+            if version < SCHEMA_VERSION and cursor.execute('SELECT 1 FROM file_index LIMIT 1').fetchone():
+                # 有数据的旧分片：这里在界面线程上，只补齐缺少的列（只改表结构，瞬间完成），
+                # 回填与建索引耗时与行数成正比，留给 migrate() 在索引任务线程执行
+                self._add_columns(cursor)
+                self.schema_version = version
+            else:
+                self._create_indexes(cursor)
+                cursor.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+                self.schema_version = SCHEMA_VERSION
+            self.conn.commit()
+
+    def needs_migration(self):
+        return self.schema_version < SCHEMA_VERSION
+
+    def migrate(self):
+        """回填旧分片的拼音键、目录汇总与后缀列并建立索引；完成前查询照常进行，只是这些条件可能匹配不全"""
+        if not self.needs_migration(): return
+        with self.lock:
+            cursor = self.conn.cursor()
+            version = self.schema_version
+            if version < 2:
+                self._migrate_pinyin(cursor)
+            if version < 3:
+                self._build_dir_stats(cursor)
+            if version < 5:
+                self._migrate_ext(cursor)
+            self._create_indexes(cursor)
+            cursor.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+            self.conn.commit()
+            self.schema_version = SCHEMA_VERSION
+        self._notify([], [], reset=True)
+
+    def _add_columns(self, cursor):
+        cols = {r[1] for r in cursor.execute('PRAGMA table_info(file_index)')}
+        for col, decl in (('py_full', 'TEXT'), ('py_initials', 'TEXT'),
+                          ('frecency', 'REAL NOT NULL DEFAULT 0'), ('ext', "TEXT NOT NULL DEFAULT ''")):
+            if col not in cols:
+                cursor.execute(f'ALTER TABLE file_index ADD COLUMN {col} {decl}')
+
+    def _migrate_pinyin(self, cursor):
+        """旧分片升级：重建包含拼音列的覆盖索引，并为中文文件名回填拼音键"""
+        for idx in ('idx_name_cover', 'idx_mtime_cover', 'idx_size_cover'):
+            cursor.execute(f'DROP INDEX IF EXISTS {idx}')
+        updates = []
+        for path, name in cursor.execute('SELECT path, name FROM file_index').fetchall():
+            full, initials = pinyin_keys(name)
+            if full:
+                updates.append((full, initials, path))
+        cursor.executemany('UPDATE file_index SET py_full = ?, py_initials = ? WHERE path = ?', updates)
+
+    def _migrate_ext(self, cursor):
+        """旧分片升级：按文件名回填后缀列"""
+        rows = cursor.execute('SELECT path, name FROM file_index').fetchall()
+        cursor.executemany('UPDATE file_index SET ext = ? WHERE path = ?',
+                           [(file_ext(name), path) for path, name in rows if file_ext(name)])
+
+    def _open_reader(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute('PRAGMA query_only=1')
+        return conn
+
+    def _create_table(self, cursor):
+        # WITHOUT ROWID：表本身按 path 聚簇，按路径排序/翻页/前缀删除无需回表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS file_index (
+                path TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                py_full TEXT,
+                py_initials TEXT,
+                frecency REAL NOT NULL DEFAULT 0,
+                ext TEXT NOT NULL DEFAULT ''
+            ) WITHOUT ROWID
+        ''')
+        # 打开记录：常用度的权威来源。file_index.frecency 是它的冗余副本，
+        # 供覆盖索引排序；文件被删除或全量重建后，从这里恢复
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS frecency (
+                path TEXT PRIMARY KEY,
+                score REAL NOT NULL,
+                opens INTEGER NOT NULL,
+                last_open REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        # 目录汇总：每个目录（含根目录）整棵子树的文件总大小、文件数与最新修改时间。
+        # 列名与 file_index 对齐（size=总大小，mtime=最新修改时间），同一套过滤/排序条件可直接复用
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS dir_stats (
+                path TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                files INTEGER NOT NULL,
+                py_full TEXT,
+                py_initials TEXT
+            ) WITHOUT ROWID
+        ''')
+
+    def _create_indexes(self, cursor):
+        # 每种排序模式一个覆盖索引：按索引顺序扫描即可边过滤边输出，LIMIT 满即停，无需排序和回表；
+        # 拼音列也放进索引，拼音匹配同样不需要回表（非中文文件名的拼音列为 NULL，几乎不占空间）
+        cursor.execute('DROP INDEX IF EXISTS idx_name')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_name_cover ON file_index(name, path, mtime, size, py_full, py_initials)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_mtime_cover ON file_index(mtime, path, name, size, py_full, py_initials)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_size_cover ON file_index(size, path, name, mtime, py_full, py_initials)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_frecency_cover ON file_index(frecency, mtime, path, name, size, py_full, py_initials)')
+        # kind: 按后缀等值查找，命中的行通常只占一小部分，取出后再排序
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_ext ON file_index(ext)')
+        # “最大的目录”“最近活跃的目录”
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_dir_size ON dir_stats(size, path, name, mtime)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_dir_mtime ON dir_stats(mtime, path, name, size)')
+
+    # ---------------- 目录汇总 ----------------
+    def _build_dir_stats(self, cursor):
+        """从 file_index 全量计算目录汇总：先按直接父目录聚合，再按路径长度从深到浅逐级累加到上级"""
+        cursor.execute('DELETE FROM dir_stats')
+        acc = {self.root: [0, 0, 0.0]}
+        for path, mtime, size in cursor.execute('SELECT path, mtime, size FROM file_index'):
+            st = acc.get(os.path.dirname(path))
+            if st is None:
+                acc[os.path.dirname(path)] = [size, 1, mtime]
+            else:
+                st[0] += size
+                st[1] += 1
+                if mtime > st[2]: st[2] = mtime
+        # 补齐中间只有子目录、没有直接文件的祖先
+        for d in list(acc):
+            if d == self.root: continue
+            for parent in self._ancestors(os.path.dirname(d)):
+                if parent in acc: break
+                acc[parent] = [0, 0, 0.0]
+        # 子目录路径一定比父目录长，按长度倒序即可保证先处理完子目录
+        for d in sorted(acc, key=len, reverse=True):
+            if d == self.root or not d.startswith(self.root): continue
+            st, parent = acc[d], acc[os.path.dirname(d)]
+            parent[0] += st[0]
+            parent[1] += st[1]
+            if st[2] > parent[2]: parent[2] = st[2]
+        cursor.executemany(
+            'INSERT INTO dir_stats (path, name, mtime, size, files, py_full, py_initials) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            ((d, os.path.basename(d) or d, st[2], st[0], st[1], *pinyin_keys(os.path.basename(d)))
+             for d, st in acc.items() if st[1] > 0)
+        )
+
+    def _ancestors(self, dir_path):
+        """dir_path 及其各级上级目录，直到分片根目录为止"""
+        while True:
+            yield dir_path
+            if dir_path == self.root or not dir_path.startswith(self.root):
+                return
+            parent = os.path.dirname(dir_path)
+            if parent == dir_path:
+                return
+            dir_path = parent
+
+    def _apply_dir_deltas(self, cursor, deltas):
+        """deltas: {目录: [字节增量, 文件数增量, 最新时间]}，沿祖先链累加到 dir_stats"""
+        if not deltas: return
+        cursor.executemany('''
+            INSERT INTO dir_stats (path, name, mtime, size, files, py_full, py_initials)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                size = size + excluded.size,
+                files = files + excluded.files,
+                mtime = MAX(mtime, excluded.mtime)
+        ''', [(d, os.path.basename(d) or d, t, b, n, *pinyin_keys(os.path.basename(d)))
+              for d, (b, n, t) in deltas.items()])
+        cursor.executemany('DELETE FROM dir_stats WHERE path = ? AND files <= 0', [(d,) for d in deltas])
+
+    def _add_delta(self, deltas, path, dbytes, dfiles, mtime):
+        for d in self._ancestors(os.path.dirname(path)):
+            st = deltas.get(d)
+            if st is None:
+                deltas[d] = [dbytes, dfiles, mtime]
+            else:
+                st[0] += dbytes
+                st[1] += dfiles
+                if mtime > st[2]: st[2] = mtime
+
+    def _upsert_rows(self, cursor, rows):
+        """写入文件行并按新旧大小差沿祖先链更新目录汇总"""
+        deltas, new_paths = {}, []
+        for row in rows:
+            path, mtime, size = row[0], row[2], row[3]
+            old = cursor.execute('SELECT size FROM file_index WHERE path = ?', (path,)).fetchone()
+            if old is None:
+                self._add_delta(deltas, path, size, 1, mtime)
+                new_paths.append((path,))
+            else:
+                self._add_delta(deltas, path, size - old[0], 0, mtime)
+        cursor.executemany(self.INSERT_SQL, rows)
+        cursor.executemany(self.RESTORE_FRECENCY_SQL, new_paths)
+        self._apply_dir_deltas(cursor, deltas)
+        self.changes_since_analyze += len(rows)
+
+    def _delete_paths(self, cursor, paths):
+        """删除文件行并从目录汇总中扣除；删除也算目录的一次“活动”，最新时间记为当前时间，
+        这与文件系统中删除文件会更新目录 mtime 的语义一致，也省去回溯子树求最大值"""
+        deltas, now = {}, time.time()
+        for path in paths:
+            old = cursor.execute('SELECT size FROM file_index WHERE path = ?', (path,)).fetchone()
+            if old is not None:
+                self._add_delta(deltas, path, -old[0], -1, now)
+        cursor.executemany('DELETE FROM file_index WHERE path = ?', [(p,) for p in paths])
+        self._apply_dir_deltas(cursor, deltas)
+        self.changes_since_analyze += len(paths)
+
+    # ---------------- 写入 ----------------
+    # 行格式：(path, name, mtime, size, py_full, py_initials, ext)；已存在时原地更新，保留 frecency
+    INSERT_SQL = '''
+        INSERT INTO file_index (path, name, mtime, size, py_full, py_initials, ext)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(path) DO UPDATE SET
+            name = excluded.name, mtime = excluded.mtime, size = excluded.size,
+            py_full = excluded.py_full, py_initials = excluded.py_initials, ext = excluded.ext
+    '''
+    # 新出现的路径（例如编辑器“删除 + 重建”式保存）从打开记录恢复常用度
+    RESTORE_FRECENCY_SQL = '''
+        UPDATE file_index SET frecency = (SELECT score FROM frecency f WHERE f.path = file_index.path)
+        WHERE path = ? AND EXISTS (SELECT 1 FROM frecency f WHERE f.path = file_index.path)
+    '''
+
+    def insert_batch(self, batch, conn=None):
+        """批量写入；传入 conn 时写入影子库（由调用方独占，无需加锁）"""
+        if not batch: return
+        if conn is not None:
+            conn.executemany(self.INSERT_SQL, batch)
+            return
+        with self.lock:
+            self._upsert_rows(self.conn.cursor(), batch)
+            self.conn.commit()
+        self._notify([row[0] for row in batch], [])
+
+    def _notify(self, upserted, removed, prefixes=(), reset=False):
+        if self.on_commit is not None:
+            self.on_commit(self, upserted, removed, list(prefixes), reset)
+
+    def note_change(self, path, alive):
+        changes = self._rebuild_changes
+        if changes is not None:
+            changes[path] = alive
+
+    def delete(self, path):
+        with self.lock:
+            self._delete_paths(self.conn.cursor(), [path])
+            self.conn.commit()
+        self._notify([], [path])
+
+    def delete_many(self, paths):
+        """paths: [(path,), ...]"""
+        if not paths: return
+        with self.lock:
+            self._delete_paths(self.conn.cursor(), [p for p, in paths])
+            self.conn.commit()
+        self._notify([], [p for p, in paths])
+
+    def delete_prefix(self, prefix):
+        """按主键范围删除整棵子树：path >= 'prefix' AND path < 'prefix\\U0010ffff'；
+        子树的汇总一次性从上级目录中扣除"""
+        end = prefix + '\U0010ffff'
+        with self.lock:
+            cursor = self.conn.cursor()
+            total, count = cursor.execute(
+                'SELECT COALESCE(SUM(size), 0), COUNT(*) FROM file_index WHERE path >= ? AND path < ?', (prefix, end)
+            ).fetchone()
+            cursor.execute('DELETE FROM file_index WHERE path >= ? AND path < ?', (prefix, end))
+            self.changes_since_analyze += count
+            top = prefix.rstrip(os.sep)
+            cursor.execute('DELETE FROM dir_stats WHERE path = ? OR (path >= ? AND path < ?)', (top, prefix, end))
+            if count and top != self.root:
+                deltas = {}
+                self._add_delta(deltas, top, -total, -count, time.time())
+                self._apply_dir_deltas(cursor, deltas)
+            self.conn.commit()
+        if count:
+            self._notify([], [], [prefix])
+
+    # ---------------- 影子库重建（可断点续建） ----------------
+    @property
+    def shadow_path(self):
+        return self.db_path + ".building"
+
+    def has_pending_build(self):
+        """是否存在上次未完成的重建（影子库与爬取检查点仍在磁盘上）"""
+        return os.path.exists(self.shadow_path)
+
+    def _connect_shadow(self, shadow_path):
+        """影子库批量导入参数：不写日志、不同步落盘、大缓存、独占锁"""
+        conn = sqlite3.connect(shadow_path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=OFF')
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.execute('PRAGMA cache_size=-262144')  # 256MB
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA locking_mode=EXCLUSIVE')
+        return conn
+
+    def _open_shadow(self, shadow_path):
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(shadow_path + suffix):
+                os.remove(shadow_path + suffix)
+        conn = self._connect_shadow(shadow_path)
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+        self._create_table(conn.cursor())
+        # 爬取检查点：待访问目录队列与进度计数，与数据写在同一个事务里，保证一致
+        conn.execute('CREATE TABLE crawl_frontier (seq INTEGER PRIMARY KEY, dir TEXT NOT NULL, depth INTEGER NOT NULL)')
+        conn.execute('CREATE TABLE crawl_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        return conn
+
+    def _resume_shadow(self):
+        """尝试续接上次的影子库，损坏或格式不符时返回 None"""
+        conn = None
+        try:
+            conn = self._connect_shadow(self.shadow_path)
+            if conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                raise sqlite3.DatabaseError("schema version mismatch")
+            if conn.execute('PRAGMA quick_check').fetchone()[0] != 'ok':
+                raise sqlite3.DatabaseError("quick_check failed")
+            frontier = conn.execute('SELECT dir, depth FROM crawl_frontier ORDER BY seq').fetchall()
+            meta = dict(conn.execute('SELECT key, value FROM crawl_meta').fetchall())
+            return conn, frontier, meta
+        except sqlite3.DatabaseError as e:
+            print(f"[IndexShard] {self.root} 无法续接上次重建，重新开始: {e}")
+            if conn is not None: conn.close()
+            return None
+
+    def begin_build(self, fresh=True):
+        """开始（fresh=True）或续接一次重建，返回 (影子库连接, 待访问目录列表, 进度计数)"""
+        if self._rebuild_changes is None:
+            self._rebuild_changes = {}
+        if not fresh and self.has_pending_build():
+            resumed = self._resume_shadow()
+            if resumed is not None:
+                return resumed
+        conn = self._open_shadow(self.shadow_path)
+        frontier = [(self.root, 0)]
+        self.checkpoint(conn, [], frontier, {})
+        return conn, frontier, {}
+
+    def checkpoint(self, conn, batch, frontier, meta):
+        """写入一批数据并保存当前爬取进度；提交后即使进程退出也能从这里续建"""
+        if batch:
+            # 排序使插入顺序接近主键顺序，B 树页写入更集中
+            batch.sort()
+            self.insert_batch(batch, conn)
+        conn.execute('DELETE FROM crawl_frontier')
+        conn.executemany('INSERT INTO crawl_frontier (dir, depth) VALUES (?, ?)', frontier)
+        conn.executemany('INSERT OR REPLACE INTO crawl_meta (key, value) VALUES (?, ?)', meta.items())
+        conn.commit()
+
+    def suspend_build(self, conn):
+        """中途停止：检查点已保存，只关闭连接，下次启动时续建"""
+        conn.close()
+
+    def finish_build(self, conn):
+        """爬取完成：清理检查点表、建索引并原子替换正式库"""
+        try:
+            conn.execute('DROP TABLE IF EXISTS crawl_frontier')
+            conn.execute('DROP TABLE IF EXISTS crawl_meta')
+            # 数据全部写入后再汇总目录、建索引，比逐行维护快得多
+            self._build_dir_stats(conn.cursor())
+            self._create_indexes(conn.cursor())
+            # 全量导入属于“大变动”，替换前在影子库上收集统计信息，此时没有读者
+            conn.execute('ANALYZE')
+            conn.commit()
+            conn.close()
+            self._swap_in(self.shadow_path)
+            return True
+        except Exception as e:
+            print(f"[IndexShard] {self.root} 重建失败，继续使用旧索引: {e}")
+            self.abort_build(conn)
+            return False
+
+    def abort_build(self, conn):
+        self._rebuild_changes = None
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        try:
+            os.remove(self.shadow_path)
+        except OSError:
+            pass
+
+    def _swap_in(self, shadow_path):
+        """用构建好的影子库原子替换正式库，读者在锁释放后自动使用新连接"""
+        with self.lock, self.read_lock:
+            # 打开记录不属于爬取结果，从旧库带到新库
+            opens = self.conn.execute('SELECT path, score, opens, last_open FROM frecency').fetchall()
+            self.conn.close()
+            self.read_conn.close()
+            # 旧库的 WAL/SHM 必须清理，否则会被套用到新库上
+            for suffix in ('-wal', '-shm'):
+                if os.path.exists(self.db_path + suffix):
+                    os.remove(self.db_path + suffix)
+            os.replace(shadow_path, self.db_path)
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.read_conn = self._open_reader()
+            self.schema_version = SCHEMA_VERSION
+
+            # 回放重建期间监听到的变动，避免替换后丢失
+            changes, self._rebuild_changes = self._rebuild_changes, None
+            upserts, removed = [], []
+            for path, alive in changes.items():
+                if alive:
+                    try:
+                        st = os.stat(path)
+                        name = os.path.basename(path)
+                        upserts.append((path, name, st.st_mtime, st.st_size, *pinyin_keys(name), file_ext(name)))
+                        continue
+                    except OSError:
+                        pass
+                removed.append(path)
+            cursor = self.conn.cursor()
+            self._upsert_rows(cursor, upserts)
+            self._delete_paths(cursor, removed)
+            cursor.executemany('INSERT OR REPLACE INTO frecency (path, score, opens, last_open) VALUES (?, ?, ?, ?)', opens)
+            cursor.executemany('UPDATE file_index SET frecency = ? WHERE path = ?', [(s, p) for p, s, _, _ in opens])
+            self.conn.commit()
+        self._notify([], [], reset=True)
+
+    # ---------------- 常用度 ----------------
+    @staticmethod
+    def frecency_now(now=None):
+        """当前时刻一次打开对应的对数分数；真实分数 = 2^(存储分数 - frecency_now())"""
+        return ((now or time.time()) - FRECENCY_EPOCH) / FRECENCY_HALF_LIFE
+
+    def record_open(self, path, now=None):
+        """记录一次打开：在对数域里累加 2^x，log2(2^a + 2^b) = max + log2(1 + 2^-|a-b|)"""
+        now = now or time.time()
+        x = self.frecency_now(now)
+        with self.lock:
+            row = self.conn.execute('SELECT score FROM frecency WHERE path = ?', (path,)).fetchone()
+            score = x if row is None else max(row[0], x) + math.log2(1 + 2 ** -abs(row[0] - x))
+            self.conn.execute('''
+                INSERT INTO frecency (path, score, opens, last_open) VALUES (?, ?, 1, ?)
+                ON CONFLICT(path) DO UPDATE SET score = excluded.score, opens = opens + 1, last_open = excluded.last_open
+            ''', (path, score, now))
+            self.conn.execute('UPDATE file_index SET frecency = ? WHERE path = ?', (score, path))
+            self.conn.commit()
+        self._notify([path], [])
+        return score
+
+    def hot_dirs(self, min_weight=0.25, limit=500):
+        """近期常打开的文件所在的目录（衰减后权重不低于 min_weight），重建时优先扫描"""
+        floor = self.frecency_now() + math.log2(min_weight)
+        with self.read_lock:
+            rows = self.read_conn.execute(
+                'SELECT path FROM frecency WHERE score >= ? ORDER BY score DESC LIMIT ?', (floor, limit)
+            ).fetchall()
+        return {os.path.dirname(p) for p, in rows}
+
+    # ---------------- 查询 ----------------
+    # 可选择性条件（size/mtime 区间、kind: 后缀）命中的行数少于该值时，改走该列的索引取出再排序
+    SELECTIVE_ROWS = 5000
+    PROBE_INDEXES = {'size': 'idx_size_cover', 'mtime': 'idx_mtime_cover', 'ext': 'idx_ext'}
+
+    def _pick_index(self, conn, probes, order):
+        """probes 为 [(列, 条件, 参数)]。规划器默认沿排序索引扫描、逐行过滤，条件很窄时几乎要读完整张表；
+        这里用 LIMIT 探测每个条件在自身索引上的行数（代价不超过 SELECTIVE_ROWS 个索引项），
+        返回命中最少且足够窄的 (索引名, 条件, 参数)。排序键中已有的列沿排序索引扫描即可，不参与探测"""
+        sort_cols = {term.split()[0] for term in order.split(',')} - {'path'}
+        best = None
+        for col, cond, params in probes:
+            index = self.PROBE_INDEXES.get(col)
+            if index is None or col in sort_cols: continue
+            n = conn.execute(f'''
+                SELECT count(*) FROM (SELECT 1 FROM file_index INDEXED BY {index} WHERE {cond} LIMIT ?)
+            ''', (*params, self.SELECTIVE_ROWS)).fetchone()[0]
+            if n < self.SELECTIVE_ROWS and (best is None or n < best[0]):
+                best = (n, index, cond, params)
+        return best and best[1:]
+
+    def search(self, where, params, order, limit, cancelled=None, table='file_index', probes=()):
+        """在只读连接上执行一页查询；cancelled() 返回 True 时中止当前语句并返回空列表。
+        table='dir_stats' 时查询目录汇总（size 为子树总大小，mtime 为子树最新修改时间）。
+        frecency 只在按常用度排序时读取：名称/时间/大小的覆盖索引不含该列，多选一列就要逐行回表。
+        probes 中足够窄的条件改用该列的索引（见 _pick_index）；旧分片升级完成前这些索引可能还不存在，不使用"""
+        frecency = 'frecency' if table == 'file_index' and order.startswith('frecency') else '0'
+        started = time.perf_counter()
+        with self.read_lock:
+            conn = self.read_conn
+            if cancelled is not None:
+                # 每执行约 1000 条虚拟机指令检查一次，返回非 0 即中止当前语句
+                conn.set_progress_handler(lambda: 1 if cancelled() else 0, 1000)
+            try:
+                source = table
+                picked = (self._pick_index(conn, probes, order)
+                          if probes and table == 'file_index' and not self.needs_migration() else None)
+                if picked:
+                    index, cond, cond_params = picked
+                    source = f'{table} INDEXED BY {index}'
+                    where, params = f'({cond}) AND {where}', (*cond_params, *params)
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT path, name, mtime, size, {frecency} FROM {source}
+                    WHERE {where}
+                    ORDER BY {order}
+                    LIMIT ?
+                ''', (*params, limit))
+                rows = FileRecord.from_rows(cursor.fetchall())
+            except sqlite3.OperationalError as e:
+                if cancelled is not None and cancelled():
+                    return []
+                raise e
+            finally:
+                if cancelled is not None:
+                    conn.set_progress_handler(None, 1000)
+        self.last_query_ms = (time.perf_counter() - started) * 1000
+        self.avg_query_ms = 0.8 * self.avg_query_ms + 0.2 * self.last_query_ms
+        return rows
+
+    def match_paths(self, paths, where, params, chunk=500):
+        """在给定路径中筛出满足查询条件的记录（主键点查，代价与路径数成正比）"""
+        out = []
+        with self.read_lock:
+            for i in range(0, len(paths), chunk):
+                part = paths[i:i + chunk]
+                cursor = self.read_conn.execute(f'''
+                    SELECT path, name, mtime, size, frecency FROM file_index
+                    WHERE path IN ({', '.join('?' * len(part))}) AND ({where})
+                ''', (*part, *params))
+                out.extend(FileRecord.from_rows(cursor.fetchall()))
+        return out
+
+    def all_rows(self):
+        with self.read_lock:
+            return self.read_conn.execute('SELECT path, mtime, size FROM file_index').fetchall()
+
+    def _fetch_all(self, sql, params, cancelled=None):
+        """在只读连接上执行一条查询；与 search 一样通过 progress_handler 响应 cancelled()，中止时返回空列表"""
+        with self.read_lock:
+            conn = self.read_conn
+            if cancelled is not None:
+                conn.set_progress_handler(lambda: 1 if cancelled() else 0, 1000)
+            try:
+                return conn.execute(sql, params).fetchall()
+            except sqlite3.OperationalError as e:
+                if cancelled is not None and cancelled():
+                    return []
+                raise e
+            finally:
+                if cancelled is not None:
+                    conn.set_progress_handler(None, 1000)
+
+    def size_groups(self, where, params, min_size, repeated_only=True, cancelled=None):
+        """按 size 分组计数（idx_size_cover 上的有序分组，不回表）；
+        repeated_only 时只返回出现多次的大小"""
+        having = 'HAVING COUNT(*) > 1' if repeated_only else ''
+        return self._fetch_all(f'''
+            SELECT size, COUNT(*) FROM file_index
+            WHERE {where} AND size >= ?
+            GROUP BY size {having}
+        ''', (*params, min_size), cancelled)
+
+    def rows_by_size(self, where, params, sizes, cancelled=None):
+        if not sizes: return []
+        return FileRecord.from_rows(self._fetch_all(f'''
+            SELECT path, name, mtime, size FROM file_index
+            WHERE {where} AND size IN ({', '.join('?' * len(sizes))})
+        ''', (*params, *sizes), cancelled))
+
+    def count(self):
+        with self.read_lock:
+            return self.read_conn.execute('SELECT COUNT(*) FROM file_index').fetchone()[0]
+
+    def size_bytes(self):
+        total = 0
+        for suffix in ('', '-wal'):
+            try:
+                total += os.path.getsize(self.db_path + suffix)
+            except OSError:
+                pass
+        return total
+
+    # ---------------- 维护 ----------------
+    # WAL 超过该大小时做 PASSIVE 检查点（不阻塞读写，尽量把 WAL 内容写回主库）
+    WAL_PASSIVE_BYTES = 4 * 1024 * 1024
+    # 空闲足够久、或 WAL 超过该大小时做 TRUNCATE 检查点，把 -wal 文件截断为 0
+    WAL_TRUNCATE_BYTES = 64 * 1024 * 1024
+    # 空闲页超过该数量时做增量 vacuum，每次最多回收 VACUUM_STEP_PAGES 页，单步耗时有上限
+    VACUUM_MIN_FREE_PAGES = 1024
+    VACUUM_STEP_PAGES = 2048
+    # 写入行数超过该数量或表行数的 10% 时重新 ANALYZE
+    ANALYZE_MIN_CHANGES = 10000
+    # 打开记录衰减超过这么多个半衰期（权重 < 2^-20）即过期：清零排序列并删除记录，
+    # 否则只打开过一次的旧文件会一直排在所有未打开的文件之前
+    FRECENCY_EXPIRE_HALF_LIVES = 20
+
+    def _wal_bytes(self):
+        try:
+            return os.path.getsize(self.db_path + '-wal')
+        except OSError:
+            return 0
+
+    def db_stats(self):
+        """主库/WAL/空闲页占用与 auto_vacuum 模式"""
+        with self.read_lock:
+            c = self.read_conn
+            page_size = c.execute('PRAGMA page_size').fetchone()[0]
+            pages = c.execute('PRAGMA page_count').fetchone()[0]
+            free = c.execute('PRAGMA freelist_count').fetchone()[0]
+            auto_vacuum = c.execute('PRAGMA auto_vacuum').fetchone()[0]
+        return {
+            "db_bytes": pages * page_size,
+            "wal_bytes": self._wal_bytes(),
+            "free_bytes": free * page_size,
+            "incremental_vacuum": auto_vacuum == 2,
+        }
+
+    def maintain(self, idle_secs, busy=None):
+        """执行一轮维护，返回做了哪些操作。每一步单独持有写锁、步骤之间释放，
+        开始每一步前调用 busy()，返回 True（有搜索进行中或刚结束）时立即停止，剩下的步骤留到下一轮。
+        维护只使用写连接、从不占用读锁：WAL 模式下读者不受 vacuum/ANALYZE 影响，
+        检查点遇到正在读的查询时不等待，直接放弃本次截断"""
+        done = []
+        steps = (self._maintain_vacuum, self._maintain_prune, self._maintain_analyze,
+                 lambda: self._maintain_checkpoint(idle_secs))
+        for step in steps:
+            if busy is not None and busy():
+                break
+            with self.lock:
+                result = step()
+            if result:
+                done.append(result)
+        return done
+
+    def _maintain_vacuum(self):
+        c = self.conn
+        if c.execute('PRAGMA auto_vacuum').fetchone()[0] != 2: return None
+        free = c.execute('PRAGMA freelist_count').fetchone()[0]
+        if free < self.VACUUM_MIN_FREE_PAGES: return None
+        # 该 PRAGMA 每执行一步只回收一页，而 execute() 只会执行第一步，
+        # 用 executescript 让语句执行到底
+        c.executescript(f'PRAGMA incremental_vacuum({self.VACUUM_STEP_PAGES});')
+        return f'incremental_vacuum({min(free, self.VACUUM_STEP_PAGES)})'
+
+    def _maintain_prune(self):
+        # 过期的打开记录：file_index 中的冗余分数清零（走 idx_frecency_cover 的范围扫描），记录本身删除
+        floor = self.frecency_now() - self.FRECENCY_EXPIRE_HALF_LIVES
+        c = self.conn
+        expired = c.execute('UPDATE file_index SET frecency = 0 WHERE frecency > 0 AND frecency < ?', (floor,)).rowcount
+        c.execute('DELETE FROM frecency WHERE score < ?', (floor,))
+        c.commit()
+        return f'expire_frecency({expired})' if expired else None
+
+    def _maintain_analyze(self):
+        if not self.changes_since_analyze: return None
+        c = self.conn
+        rows = c.execute('SELECT COUNT(*) FROM file_index').fetchone()[0]
+        if self.changes_since_analyze >= max(self.ANALYZE_MIN_CHANGES, rows // 10):
+            c.execute('ANALYZE')
+            c.commit()
+            self.changes_since_analyze = 0
+            return 'analyze'
+        # optimize 只在统计信息明显过时的表上重新分析，通常是空操作
+        c.execute('PRAGMA optimize')
+        c.commit()
+        return None
+
+    def _maintain_checkpoint(self, idle_secs):
+        # 检查点放在最后，vacuum/ANALYZE 产生的 WAL 也一并写回
+        wal = self._wal_bytes()
+        if wal and (wal >= self.WAL_TRUNCATE_BYTES or idle_secs >= 60):
+            mode = 'TRUNCATE'
+        elif wal >= self.WAL_PASSIVE_BYTES:
+            mode = 'PASSIVE'
+        else:
+            return None
+        c = self.conn
+        # TRUNCATE 需要等所有读者结束；不等待，遇到读者直接返回 busy，下一轮再试
+        c.execute('PRAGMA busy_timeout=0')
+        try:
+            busy = c.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()[0]
+        finally:
+            c.execute('PRAGMA busy_timeout=5000')
+        return f'checkpoint({mode}{", busy" if busy else ""})'
+
+    def close(self):
+        with self.lock, self.read_lock:
+            self.conn.close()
+            self.read_conn.close()
+
+    def drop(self):
+        """移除根目录时调用：关闭连接并删除分片文件"""
+        self.close()
+        for suffix in ('', '-wal', '-shm', '.building'):
+            try:
+                os.remove(self.db_path + suffix)
+            except OSError:
+                pass
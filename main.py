@@ -3,13 +3,16 @@ import sys
 import os
 import time
 import subprocess
+import multiprocessing
+import threading
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QLineEdit, 
     QFrame, QSizeGrip, QHBoxLayout, QLabel, 
-    QGraphicsDropShadowEffect, QDialog
+    QGraphicsDropShadowEffect, QDialog, QComboBox, QMessageBox
 )
 from PyQt5.QtCore import Qt, QTimer, QThread, pyqtSignal, QEvent
 from PyQt5.QtGui import QColor
+from operator import attrgetter
 
 # 导入自定义模块
 from window_behavior import FramelessWindowMixin
@@ -20,59 +23,104 @@ from status_bar import StatusBar
 from config_manager import ConfigManager
 from index_manager import IndexManager
 from settings_ui import SettingsDialog
+from content_grep import ContentGrepThread, shutdown_pool
+from duplicate_finder import DuplicateFinderThread
+from stall_watchdog import StallWatchdog
 
 class IndexSearchWorker(QThread):
-    """异步搜索线程：从 SQLite 索引查询"""
-    res_signal = pyqtSignal(list)
+    """常驻搜索线程：只有一个任务槽，新查询直接覆盖旧查询（latest-query-wins），
+    正在执行的过期 SQL 通过 progress_handler 立即中止"""
+    # (任务序号, 结果批次)
+    res_signal = pyqtSignal(int, list)
+    # (任务序号, 下一页游标或 None, 查询耗时毫秒)
+    page_done = pyqtSignal(int, object, float)
 
-    def __init__(self, index_mgr, search_mgr):
+    PAGE_SIZE = 500
+
+    def __init__(self, index_mgr):
         super().__init__()
         self.index_mgr = index_mgr
-        self.search_mgr = search_mgr
-        self._stop = False
+        self._cond = threading.Condition()
+        self._job = None
+        self._seq = 0
+        self._running = True
+
+    def submit(self, search_mgr, sort='mtime', after=None):
+        """投递查询并返回任务序号；在主线程编译条件，之后改写 SearchManager 也不会串扰"""
+        filters = self.index_mgr.compile_filters(search_mgr)
+        with self._cond:
+            self._seq += 1
+            self._job = (self._seq, filters, search_mgr.content_query, search_mgr.name_regex, sort, after)
+            self._cond.notify()
+            return self._seq
+
+    def cancel(self):
+        """作废当前任务（例如切换到 grep 查询时）"""
+        with self._cond:
+            self._seq += 1
+            self._job = None
 
     def stop(self):
-        self._stop = True
+        with self._cond:
+            self._running = False
+            self._seq += 1
+            self._job = None
+            self._cond.notify()
+        self.wait()
+
+    def _is_stale(self, seq):
+        return seq != self._seq
+
+    def _emit_batches(self, seq, records):
+        for i in range(0, len(records), 50):
+            if self._is_stale(seq): return
+            self.res_signal.emit(seq, records[i:i + 50])
 
     def run(self):
-        all_raw_results = []
-        seen_paths = set()
-        
-        # 1. 构建查询列表
-        # 如果是 OR 模式，查询列表就是 or_kws；如果是 AND，就用第一个词
-        search_targets = []
-        if self.search_mgr.or_kws:
-            search_targets = self.search_mgr.or_kws
-        elif self.search_mgr.and_kws:
-            search_targets = [self.search_mgr.and_kws[0]]
-        else:
-            # 没关键词时，捞取最近更新的 1000 条（SQL 默认逻辑）
-            search_targets = [""]
-
-        # 2. 循环执行 SQL 捞取并去重
-        for kw in search_targets:
-            if self._stop: break
-            # 每个关键词去库里捞 1000 条
-            res = self.index_mgr.search_name(kw, max_results=1000)
-            for item in res:
-                if item['path'] not in seen_paths:
-                    all_raw_results.append(item)
-                    seen_paths.add(item['path'])
-
-        # 3. 在 Python 端进行最终的逻辑精筛（处理 NOT、EXT 等）
-        batch = []
-        for item in all_raw_results:
-            if self._stop: break
-            if self.search_mgr.is_match(item["name"]):
-                batch.append(item)
-                if len(batch) >= 50:
-                    self.res_signal.emit(batch)
-                    batch = []
-        
-        if batch and not self._stop:
-            self.res_signal.emit(batch)
+        while True:
+            with self._cond:
+                while self._running and self._job is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                job, self._job = self._job, None
+
+            seq, filters, content_query, name_regex, sort, after = job
+            started = time.perf_counter()
+            try:
+                if content_query:
+                    # 内容检索：直接从全文索引捞取，结果与文件名结果走同一信号
+                    page = self.index_mgr.search_content(content_query, max_results=1000)
+                    self._emit_batches(seq, page)
+                    cursor = None
+                elif name_regex is not None:
+                    # 正则模式：SQL 按字面量片段粗筛，分批用正则确认并边确认边回传；
+                    # 超出时间预算时返回游标，滚动到底部可继续扫描
+                    page, cursor = self.index_mgr.search_regex(
+                        filters, name_regex, self.PAGE_SIZE, sort, after,
+                        cancelled=lambda: self._is_stale(seq),
+                        on_batch=lambda recs: self._emit_batches(seq, recs))
+                else:
+                    # 所有条件（AND/OR/NOT/后缀）都在 SQL 中完成，按所选排序的覆盖索引顺序扫描；
+                    # 没有关键词时就是“最近修改的文件”，同样只扫描索引
+                    page = self.index_mgr.search(filters, self.PAGE_SIZE, sort, after,
+                                                 cancelled=lambda: self._is_stale(seq))
+                    self._emit_batches(seq, page)
+                    cursor = page[-1] if len(page) >= self.PAGE_SIZE else None
+            except Exception as e:
+                print(f"[IndexSearchWorker] 查询失败: {e}")
+                page, cursor = [], None
+
+            if not self._is_stale(seq):
+                self.page_done.emit(seq, cursor, (time.perf_counter() - started) * 1000)
 
 class SearchApp(QWidget, FramelessWindowMixin):
+    # 重建进度（来自后台线程，经信号转到主线程）；格式化后的进度文本供托盘使用
+    index_progress = pyqtSignal(dict)
+    index_status_text = pyqtSignal(str)
+    # 常驻查询的增量（来自写入线程）：(登记代号, 新增或更新的记录, 移除的路径, 移除的目录前缀, 是否整体刷新)
+    standing_delta = pyqtSignal(int, list, list, list, bool)
+
     def __init__(self):
         super().__init__()
         # 1. 配置管理
@@ -83,28 +131,76 @@ class SearchApp(QWidget, FramelessWindowMixin):
         self.mgr = SearchManager()
         self.index_mgr = IndexManager(
             search_paths=self.config.get("search_paths", [os.path.expanduser("~")]),
-            show_hidden=self.config.get("show_hidden", False)
+            show_hidden=self.config.get("show_hidden", False),
+            content_index=self.config.get("content_index", False),
+            files_per_sec=self.config.get("index_files_per_sec", 0),
+            exclude_rules=self.config.get("exclude_rules", ""),
+            pinned_paths=self.config.get("pinned_paths", [])
         )
+        if self.config.get("event_trace"):
+            self.index_mgr.start_trace(os.path.expanduser(self.config["event_trace"]))
+        self.index_mgr.progress_cb = self.index_progress.emit
+        self.index_progress.connect(self._on_index_progress)
         self.index_mgr.start_monitoring()
 
         # 3. UI 布局与行为
         self._init_window_behavior()
         self._setup_ui()
         
-        # 4. 线程管理
-        self.worker = None
+        # 4. 线程管理：常驻搜索线程，整个生命周期只创建一次
+        self.worker = IndexSearchWorker(self.index_mgr)
+        self.worker.res_signal.connect(self._on_worker_batch)
+        self.worker.page_done.connect(self._on_page_done)
+        self.worker.start()
+        self.standing_delta.connect(self._on_standing_delta)
+        self.standing_gen = 0
+        self.search_seq = 0
+        self.page_cursor = None
+        self.page_pending = False
+        self.grep_thread = None
+        self.dupe_thread = None
+        # 已停止但可能仍在运行的线程：保留引用直到 finished，避免 QThread 在运行中被回收
+        self.retired_threads = []
         self.rebuild_thread = None
+        self.index_tasks = []
+        # 旧版本分片的回填与建索引放在最前面，在后台执行，不阻塞窗口
+        if self.index_mgr.needs_migration():
+            self._run_index_task(self.index_mgr.migrate_shards, "正在升级索引...", "索引升级完成")
+        # 上次重建中途退出：从检查点继续
+        if self.index_mgr.has_pending_rebuild():
+            self._run_index_task(self.index_mgr.resume_rebuild, "正在继续上次未完成的索引...", "索引更新完成")
+        elif self.index_mgr.has_legacy_index():
+            # 从旧版单库索引升级：先导入，马上可以搜索；再在后台重建，校正旧库中过期的条目
+            self._run_index_task(self.index_mgr.import_legacy_index, "正在导入旧版索引...", "旧版索引已导入")
+            self.trigger_rebuild()
+        elif self.index_mgr.needs_initial_build():
+            # 首次启动：按优先级爬取，边扫描边写入正式库，几秒内就能搜到常用目录
+            self.trigger_rebuild()
+        elif self.index_mgr.content:
+            # 重建结束时会顺带同步内容索引；没有重建时单独在后台补齐
+            self._run_index_task(self.index_mgr.sync_content, "正在同步内容索引...", "内容索引已同步")
         
         # 5. 全局热键
         hotkey_str = self.config.get("hotkey", "option+space")
         self.hotkey_thread = GlobalHotKey(hotkey_str, self.toggle_window)
         self.hotkey_thread.start()
 
-        # 6. 搜索防抖
+        # 6. 搜索防抖：间隔根据实测查询耗时自适应
+        self.query_latency_ms = 50.0
         self.search_timer = QTimer()
         self.search_timer.setSingleShot(True)
         self.search_timer.timeout.connect(self._start_search)
 
+        # 7. 可选的界面卡顿监测：记录超过阈值的主线程停顿及当时的调用栈
+        self.stall_watchdog = None
+        if self.config.get("stall_watchdog_ms"):
+            self.stall_watchdog = StallWatchdog(
+                self.config["stall_watchdog_ms"],
+                context=lambda: f"查询 {self.input.text()!r} · {self.results.topLevelItemCount()} 个结果")
+
+        # 输入框为空时就列出最近修改/常用的文件
+        self._start_search()
+
         # 窗口属性
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool)
         self.setAttribute(Qt.WA_TranslucentBackground)
@@ -127,15 +223,19 @@ class SearchApp(QWidget, FramelessWindowMixin):
         
         v = QVBoxLayout(self.container)
         self.input = QLineEdit()
-        self.input.setPlaceholderText("输入文件名，支持 !排除 .后缀 |或者...")
+        self.input.setPlaceholderText("输入文件名，支持 !排除 .后缀 |或者 content:内容 grep:实时内容...")
         self.input.setStyleSheet("QLineEdit { font-size: 18px; border: none; padding: 15px; background: transparent; }")
-        self.input.textChanged.connect(lambda: self.search_timer.start(250))
+        self.input.textChanged.connect(lambda: self.search_timer.start(self._debounce_ms()))
         self.input.installEventFilter(self)
         v.addWidget(self.input)
         
         self.results = SearchResultWidget()
         self.results.open_signal.connect(lambda p: subprocess.run(["open", p]))
         self.results.finder_signal.connect(lambda p: subprocess.run(["open", "-R", p]))
+        # 打开/定位过的文件计入常用度，之后的搜索排在前面
+        self.results.open_signal.connect(self.index_mgr.record_open_async)
+        self.results.finder_signal.connect(self.index_mgr.record_open_async)
+        self.results.load_more.connect(self._load_more)
         v.addWidget(self.results)
         
         b = QHBoxLayout()
@@ -143,6 +243,13 @@ class SearchApp(QWidget, FramelessWindowMixin):
         self.status_label.setStyleSheet("color: #888; font-size: 11px; padding: 5px;")
         b.addWidget(self.status_label)
         b.addStretch()
+        self.sort_box = QComboBox()
+        for label, mode in (("常用优先", "frecency"), ("按修改时间", "mtime"), ("按名称", "name"),
+                            ("按大小", "size"), ("按路径", "path")):
+            self.sort_box.addItem(label, mode)
+        self.sort_box.setStyleSheet("font-size: 11px; color: #888;")
+        self.sort_box.currentIndexChanged.connect(lambda _: self._start_search())
+        b.addWidget(self.sort_box)
         self.grip = QSizeGrip(self.container)
         b.addWidget(self.grip)
         v.addLayout(b)
@@ -163,39 +270,169 @@ class SearchApp(QWidget, FramelessWindowMixin):
     def _start_search(self):
         query = self.input.text().strip()
         
-        # 停止旧线程，防止结果串扰
-        if self.worker and self.worker.isRunning():
-            self.worker.res_signal.disconnect()
-            self.worker.stop()
+        # 作废旧查询，防止结果串扰；常驻线程会中止仍在执行的过期 SQL
+        self.worker.cancel()
+        self.search_seq = 0
+        self.page_cursor = None
+        self.page_pending = False
+        self._stop_grep_thread()
+        self._stop_dupe_thread()
+        self.standing_gen += 1
+        self.index_mgr.clear_standing_query()
 
         self.results.clear()
-        if not query:
-            self.status_label.setText("Ready")
-            return
-        
+        # 空查询不提前返回：没有任何条件时按所选排序列出最近修改/常用的文件，
+        # 同样按覆盖索引顺序扫描、分页加载
         self.status_label.setText("搜索中...")
         self.mgr.set_query(query)
-        self.worker = IndexSearchWorker(self.index_mgr, self.mgr)
-        self.worker.res_signal.connect(self._add_res_batch)
-        self.worker.start()
+
+        # grep: 查询走实时内容扫描线程
+        if self.mgr.grep_pattern:
+            self.grep_thread = ContentGrepThread(self.index_mgr, self.mgr)
+            self.grep_thread.results_batch_found.connect(self._add_res_batch)
+            self.grep_thread.search_finished.connect(
+                lambda: self.status_label.setText(f"grep 完成，找到 {self.results.topLevelItemCount()} 个结果")
+            )
+            self.grep_thread.start()
+            return
+
+        # dupes: 查重，结果按重复组分组显示
+        if self.mgr.find_dupes:
+            self.dupe_thread = DuplicateFinderThread(self.index_mgr, self.mgr)
+            self.dupe_thread.group_found.connect(self._add_dup_group)
+            self.dupe_thread.progress.connect(self.status_label.setText)
+            self.dupe_thread.search_finished.connect(
+                lambda: self.status_label.setText(f"查重完成，共 {self.results.topLevelItemCount()} 组重复文件")
+            )
+            self.dupe_thread.start()
+            return
+
+        self._submit_page(None)
+        # 登记为常驻查询：之后文件增删改只推送与该查询相关的增量，无需重新搜索
+        if not self.mgr.content_query:
+            gen = self.standing_gen
+            self.index_mgr.set_standing_query(
+                self.mgr, lambda *delta: self.standing_delta.emit(gen, *delta))
+
+    def _on_standing_delta(self, gen, records, removed, prefixes, reset):
+        if gen != self.standing_gen:
+            return
+        if reset:
+            # 索引整体替换（重建完成），重新执行当前查询
+            self._start_search()
+            return
+        self.results.remove_paths(removed, prefixes)
+        keys, desc = IndexManager.SORT_MODES.get(self.sort_box.currentData(), IndexManager.SORT_MODES['mtime'])
+        key = attrgetter(*keys)
+        # 列表长度不超过已加载的窗口（至少一页）：首次建索引的检查点批次、解压/克隆等
+        # 批量变动一次可能推来上万条，只有排在最前的 limit 条可能留在窗口内
+        limit = max(self.worker.PAGE_SIZE, self.results.topLevelItemCount())
+        if len(records) > limit:
+            records = sorted(records, key=key, reverse=desc)[:limit]
+        # 后面还有未加载的分页时，排在末尾之后的新项留给下一页
+        at_end = self.page_cursor is None and not self.page_pending
+        for rec in records:
+            self.results.insert_sorted(self._make_item(rec, key), desc, at_end)
+        # 超出窗口的部分丢弃，从保留的最后一条继续正常分页
+        last = self.results.trim(limit)
+        if last is not None:
+            if self.page_pending:
+                # 进行中的分页游标已落在被丢弃的项之后，作废后改从新的末尾加载
+                self.worker.cancel()
+                self.search_seq = 0
+                self.page_pending = False
+            self.page_cursor = last.record
+        self._show_result_count()
+
+    def _retire_thread(self, thread):
+        """已调用 stop() 的线程还要一会儿才退出，保留引用到 finished 为止"""
+        self.retired_threads.append(thread)
+        thread.finished.connect(lambda: self._forget_thread(thread))
+        if not thread.isRunning():
+            self._forget_thread(thread)
+
+    def _forget_thread(self, thread):
+        if thread in self.retired_threads:
+            self.retired_threads.remove(thread)
+
+    def _stop_grep_thread(self):
+        if self.grep_thread and self.grep_thread.isRunning():
+            self.grep_thread.results_batch_found.disconnect()
+            self.grep_thread.search_finished.disconnect()
+            self.grep_thread.stop()
+            self._retire_thread(self.grep_thread)
+        self.grep_thread = None
+
+    def _stop_dupe_thread(self):
+        if self.dupe_thread and self.dupe_thread.isRunning():
+            self.dupe_thread.group_found.disconnect()
+            self.dupe_thread.progress.disconnect()
+            self.dupe_thread.search_finished.disconnect()
+            self.dupe_thread.stop()
+            self._retire_thread(self.dupe_thread)
+        self.dupe_thread = None
+
+    def _add_dup_group(self, records):
+        home = os.path.expanduser("~")
+        items = [SearchResultItem(rec.name, self._fmt_size(rec.size),
+                                  time.strftime("%Y-%m-%d", time.localtime(rec.mtime)),
+                                  os.path.dirname(rec.path).replace(home, "~"), rec.path, rec.mtime)
+                 for rec in records]
+        size = records[0].size
+        title = f"{len(records)} 个相同文件 · 每个 {self._fmt_size(size)} · 可释放 {self._fmt_size(size * (len(records) - 1))}"
+        self.results.add_group(title, items)
+
+    def _submit_page(self, after):
+        self.page_pending = True
+        self.search_seq = self.worker.submit(self.mgr, self.sort_box.currentData(), after)
+
+    def _debounce_ms(self):
+        # 查询越快防抖越短：约为查询耗时的 2 倍，限制在 30~300ms
+        return int(min(300, max(30, 2 * self.query_latency_ms)))
+
+    def _on_worker_batch(self, seq, items):
+        if seq == self.search_seq:
+            self._add_res_batch(items)
+
+    def _on_page_done(self, seq, last, elapsed_ms):
+        if seq != self.search_seq:
+            return
+        # 指数滑动平均，平滑偶发的慢查询
+        self.query_latency_ms = 0.7 * self.query_latency_ms + 0.3 * elapsed_ms
+        self.page_pending = False
+        self.page_cursor = last
+
+    def _load_more(self):
+        """滚动到底部时按 keyset 游标加载下一页，每页代价与已加载页数无关"""
+        if self.page_cursor is None or self.page_pending:
+            return
+        after, self.page_cursor = self.page_cursor, None
+        self._submit_page(after)
 
     def _add_res_batch(self, items):
-        # 1. 暂时关闭排序，提高插入效率并防止列表跳动
-        self.results.setSortingEnabled(False)
-        
-        for i in items:
-            sz = self._fmt_size(i['size'])
-            tm = time.strftime("%Y-%m-%d", time.localtime(i['mtime']))
-            pd = os.path.dirname(i['path']).replace(os.path.expanduser("~"), "~")
-            item = SearchResultItem(i['name'], sz, tm, pd, i['path'], i['mtime'])
-            self.results.addTopLevelItem(item)
-            
-        # 2. 重新开启排序，并指定按第 2 列（mtime 隐藏列，索引从 0 开始）降序
-        # 注意：在 SearchResultItem 中，我们重写了 __lt__，它会根据数值进行逻辑排序
-        self.results.setSortingEnabled(True)
-        self.results.sortItems(0, Qt.DescendingOrder) # 这里排第 0 列其实是调用 item 的 __lt__
-        
-        self.status_label.setText(f"找到 {self.results.topLevelItemCount()} 个结果")
+        # 结果已按所选排序从 SQL 有序返回，分页直接追加即可，无需在界面端重新排序
+        keys, _ = IndexManager.SORT_MODES.get(self.sort_box.currentData(), IndexManager.SORT_MODES['mtime'])
+        key = attrgetter(*keys)
+        self.results.add_items([self._make_item(rec, key) for rec in items])
+
+        self._show_result_count()
+
+    def _show_result_count(self):
+        text = f"找到 {self.results.topLevelItemCount()} 个结果"
+        if self.index_mgr.is_partial():
+            # 首次建立索引尚未完成，结果只覆盖已扫描的目录
+            text += "（部分索引）"
+        self.status_label.setText(text)
+
+    def _make_item(self, rec, key):
+        home = os.path.expanduser("~")
+        sz = self._fmt_size(rec.size)
+        tm = time.strftime("%Y-%m-%d", time.localtime(rec.mtime))
+        pd = os.path.dirname(rec.path).replace(home, "~")
+        item = SearchResultItem(rec.name, sz, tm, pd, rec.path, rec.mtime)
+        item.sort_key = key(rec)
+        item.record = rec
+        return item
 
     def _fmt_size(self, s):
         for u in ['B','K','M','G']:
@@ -205,19 +442,93 @@ class SearchApp(QWidget, FramelessWindowMixin):
 
     def trigger_rebuild(self):
         """异步重建索引"""
-        if self.rebuild_thread and self.rebuild_thread.isRunning():
+        if any(t[0] == self.index_mgr.rebuild_index for t in self.index_tasks):
             return
-            
-        self.status_label.setText("正在全量扫描磁盘...")
+        self._run_index_task(self.index_mgr.rebuild_index, "正在全量扫描磁盘...", "索引更新完成")
+
+    def _run_index_task(self, task, start_msg, done_msg):
+        """在后台线程执行索引任务；已有任务在跑时排队，保证同一时间只有一个写入任务"""
+        self.index_tasks.append((task, start_msg, done_msg))
+        if not (self.rebuild_thread and self.rebuild_thread.isRunning()):
+            self._next_index_task()
+
+    def _next_index_task(self):
+        if not self.index_tasks: return
+        task, start_msg, done_msg = self.index_tasks[0]
+        self.status_label.setText(start_msg)
         self.rebuild_thread = QThread()
-        # 这里的逻辑建议封装进 IndexManager
-        self.rebuild_thread.run = self.index_mgr.rebuild_index
-        self.rebuild_thread.finished.connect(lambda: self.status_label.setText("索引更新完成"))
+        self.rebuild_thread.run = task
+        self.rebuild_thread.finished.connect(lambda: self._on_index_task_done(done_msg))
         self.rebuild_thread.start()
 
+    def _on_index_task_done(self, done_msg):
+        self.index_tasks.pop(0)
+        self.status_label.setText(done_msg)
+        self.index_status_text.emit("")
+        self._next_index_task()
+
+    def _on_index_progress(self, info):
+        root = info["root"].replace(os.path.expanduser("~"), "~")
+        if info.get("stage") in ("content", "migrate"):
+            if info["stage"] == "content":
+                text = f"正在同步内容索引 · {root} · 已读取 {info['files']} 个文件"
+            else:
+                text = f"正在升级索引 {root} · {info['files']} 个文件"
+            self.status_label.setText(text)
+            self.index_status_text.emit(text)
+            return
+        text = "部分索引 · " if info.get("partial") else ""
+        text += f"正在索引 {root} · {info['dirs']} 个目录 / {info['files']} 个文件 · {info['rate']:.0f} 个/秒"
+        if info["eta"] is not None:
+            text += f" · 剩余约 {self._fmt_eta(info['eta'])}"
+        self.status_label.setText(text)
+        self.index_status_text.emit(text)
+
+    def _fmt_eta(self, secs):
+        if secs < 60: return f"{int(secs)} 秒"
+        if secs < 3600: return f"{int(secs // 60)} 分钟"
+        return f"{secs / 3600:.1f} 小时"
+
+    def showEvent(self, event):
+        # 窗口在用时重建降速、降优先级
+        self.index_mgr.set_foreground(True)
+        if self.stall_watchdog:
+            self.stall_watchdog.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.index_mgr.set_foreground(False)
+        if self.stall_watchdog:
+            self.stall_watchdog.pause()
+        super().hideEvent(event)
+
+    def show_index_stats(self):
+        """展示各分片的文件数、大小与查询耗时"""
+        lines = []
+        for st in self.index_mgr.shard_stats():
+            root = st["root"].replace(os.path.expanduser("~"), "~")
+            lines.append(f"{root}\n    {st['files']} 个文件 · {self._fmt_size(st['bytes'])} · "
+                         f"最近查询 {st['last_query_ms']:.1f}ms · 平均 {st['avg_query_ms']:.1f}ms\n"
+                         f"    主库 {self._fmt_size(st['db_bytes'])} · WAL {self._fmt_size(st['wal_bytes'])} · "
+                         f"空闲页 {self._fmt_size(st['free_bytes'])}"
+                         + ("" if st['incremental_vacuum'] else "（下次重建后启用增量回收）"))
+        QMessageBox.information(self, "索引状态", "\n".join(lines) or "没有索引目录")
+
     def safe_quit(self):
         print("清理资源退出...")
-        self.index_mgr.stop_monitoring()
+        self.worker.stop()
+        if self.stall_watchdog:
+            self.stall_watchdog.stop()
+        self._stop_grep_thread()
+        self._stop_dupe_thread()
+        for thread in list(self.retired_threads):
+            thread.wait(1000)
+        # 重建在下一个目录边界保存检查点后退出，下次启动续建
+        self.index_mgr.stop_rebuild()
+        if self.rebuild_thread and self.rebuild_thread.isRunning():
+            self.rebuild_thread.wait(3000)
+        self.index_mgr.close()
+        shutdown_pool()
         if self.hotkey_thread:
             self.hotkey_thread.stop()
         QApplication.quit()
@@ -274,15 +585,22 @@ class SearchApp(QWidget, FramelessWindowMixin):
             # 2. 保存到本地文件
             self.config_mgr.save_config(new_config)
             
-            # 3. 如果路径变了，提示用户并重启监控
-            if new_config["search_paths"] != self.config["search_paths"]:
-                self.index_mgr.stop_monitoring()
-                self.index_mgr.search_paths = new_config["search_paths"]
-                self.index_mgr.start_monitoring()
-                # 自动触发一次增量/全量扫描
-                self.trigger_rebuild()
-
-            # 4. 如果快捷键变了，重启热键线程
+            # 3. 按配置差异增量更新索引：只扫描新增目录、删除移除目录的分片，
+            #    隐藏文件/排除规则变化做定向清理与补扫，监控随分片增减
+            diff = self.config_mgr.diff(self.config, new_config)
+            if diff["added_paths"] or diff["removed_paths"] or "show_hidden" in diff or "exclude_rules" in diff:
+                self._run_index_task(lambda: self.index_mgr.apply_config_diff(diff),
+                                     "正在更新索引...", "索引已更新")
+
+            # 4. 内容索引开关
+            #    开启时要读取全部分片补齐内容，与其他索引任务一样排队在后台执行
+            if new_config.get("content_index", False) != self.config.get("content_index", False):
+                enabled = new_config.get("content_index", False)
+                self._run_index_task(lambda: self.index_mgr.set_content_index(enabled),
+                                     "正在同步内容索引..." if enabled else "正在关闭内容索引...",
+                                     "内容索引已开启" if enabled else "内容索引已关闭")
+
+            # 5. 如果快捷键变了，重启热键线程
             if new_config["hotkey"] != self.config["hotkey"]:
                 self.hotkey_thread.stop()
                 self.hotkey_thread = GlobalHotKey(new_config["hotkey"], self.toggle_window)
@@ -293,6 +611,8 @@ class SearchApp(QWidget, FramelessWindowMixin):
             self.status_label.setText("设置已保存，正在更新索引...")
 
 def main():
+    # 内容索引使用进程池，打包成 .app 后需要此调用
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     app.setQuitOnLastWindowClosed(False)
     
@@ -305,6 +625,8 @@ def main():
     status_bar.show_window.connect(window.show_and_focus)
     status_bar.show_settings.connect(window.open_settings)
     status_bar.rebuild_index.connect(window.trigger_rebuild)
+    status_bar.show_stats.connect(window.show_index_stats)
+    window.index_status_text.connect(status_bar.set_progress)
     status_bar.quit_app.connect(window.safe_quit)
 
     sys.exit(app.exec_())
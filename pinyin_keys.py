@@ -0,0 +1,26 @@
+# pinyin_keys.py
+# 可选依赖：未安装 pypinyin 时不生成拼音键，搜索退化为普通子串匹配
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:
+    lazy_pinyin = None
+
+
+def has_cjk(text):
+    return any('\u4e00' <= ch <= '\u9fff' or '\u3400' <= ch <= '\u4dbf' for ch in text)
+
+
+def pinyin_keys(name):
+    """返回 (全拼, 首字母)，如 报告2024.docx -> ('baogao2024.docx', 'bg2024.docx')；
+    文件名不含汉字或未安装 pypinyin 时返回 (None, None)"""
+    if lazy_pinyin is None or not has_cjk(name):
+        return None, None
+    low = name.lower()
+    full = ''.join(lazy_pinyin(low)).lower()
+    initials = ''.join(lazy_pinyin(low, style=Style.FIRST_LETTER)).lower()
+    return full, initials
+
+
+def is_pinyin_query(kw):
+    """只有纯 ASCII 且含字母的关键词才可能是拼音输入"""
+    return kw.isascii() and any(ch.isalpha() for ch in kw)
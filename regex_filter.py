@@ -0,0 +1,64 @@
+# regex_filter.py
+# re: 查询模式的辅助函数：从正则中提取“必然出现”的字面量片段，
+# 先交给 SQLite 用 name LIKE 粗筛候选，再用预编译的正则逐批确认
+import re
+
+try:
+    import re._parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+# 短于该长度的片段几乎没有筛选力，不参与预过滤
+MIN_FRAGMENT = 2
+
+
+def compile_name_regex(pattern):
+    """文件名正则统一忽略大小写，与关键词搜索保持一致；非法正则返回 None"""
+    try:
+        return re.compile(pattern, re.IGNORECASE)
+    except re.error:
+        return None
+
+
+def required_literals(pattern):
+    """返回匹配成立时文件名中必然包含的片段，结构为 AND 列表：
+    元素是字符串，或 ('or', [AND 列表, ...]) 表示分支中至少一支成立。
+    例如 ^IMG_\\d{4}\\.(jpe?g|heic)$ -> ['img_', ('or', [['jp'], ['heic']])]"""
+    try:
+        parsed = sre_parse.parse(pattern, re.IGNORECASE)
+    except re.error:
+        return []
+    return _walk(list(parsed))
+
+
+def _walk(items):
+    terms, buf = [], []
+
+    def flush():
+        frag = ''.join(buf).lower()
+        buf.clear()
+        # LIKE 只对 ASCII 忽略大小写，含其他有大小写区分的字符时放弃该片段以免漏掉结果
+        if len(frag) >= MIN_FRAGMENT and all(c.isascii() or c.lower() == c.upper() for c in frag):
+            terms.append(frag)
+
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            buf.append(chr(av))
+            continue
+        flush()
+        if op is sre_parse.SUBPATTERN:
+            terms.extend(_walk(list(av[-1])))
+        elif op is getattr(sre_parse, 'ATOMIC_GROUP', None):
+            terms.extend(_walk(list(av)))
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT,
+                    getattr(sre_parse, 'POSSESSIVE_REPEAT', None)):
+            lo, _, sub = av
+            if lo >= 1:
+                terms.extend(_walk(list(sub)))
+        elif op is sre_parse.BRANCH:
+            alts = [_walk(list(b)) for b in av[1]]
+            # 只要有一支没有可用片段，这组分支就不能用于过滤
+            if alts and all(alts):
+                terms.append(('or', alts))
+    flush()
+    return terms
@@ -1,5 +1,88 @@
 #search_manager.py
+import os
 import re
+import time
+from datetime import datetime
+from regex_filter import compile_name_regex
+
+# kind: 过滤使用的后缀分组
+KIND_EXTS = {
+    'image': ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tif', '.tiff', '.webp', '.heic', '.heif',
+              '.svg', '.ico', '.raw', '.cr2', '.nef', '.arw', '.dng', '.psd'],
+    'video': ['.mp4', '.mov', '.m4v', '.avi', '.mkv', '.wmv', '.flv', '.webm', '.mpg', '.mpeg', '.3gp', '.ts'],
+    'audio': ['.mp3', '.m4a', '.aac', '.wav', '.flac', '.ogg', '.aiff', '.aif', '.wma', '.opus'],
+    'doc': ['.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.pages', '.numbers', '.key',
+            '.txt', '.md', '.rtf', '.csv', '.odt', '.ods', '.odp', '.epub'],
+    'archive': ['.zip', '.rar', '.7z', '.tar', '.gz', '.tgz', '.bz2', '.xz', '.dmg', '.iso', '.pkg'],
+    'code': ['.py', '.js', '.ts', '.jsx', '.tsx', '.java', '.kt', '.swift', '.m', '.c', '.h', '.cpp',
+             '.hpp', '.cs', '.go', '.rs', '.rb', '.php', '.sh', '.sql', '.html', '.css', '.vue'],
+}
+
+SIZE_UNITS = {'': 1, 'b': 1, 'k': 1024, 'kb': 1024, 'm': 1024 ** 2, 'mb': 1024 ** 2,
+              'g': 1024 ** 3, 'gb': 1024 ** 3, 't': 1024 ** 4, 'tb': 1024 ** 4}
+AGE_UNITS = {'h': 3600, 'd': 86400, 'w': 7 * 86400, 'm': 30 * 86400, 'y': 365 * 86400}
+
+FILTER_RE = re.compile(r'(?<!\S)(size|modified|mtime|kind)[:：](\S+)', re.IGNORECASE)
+REGEX_RE = re.compile(r'(?<!\S)re[:：](?:"([^"]*)"|(\S+))')
+SCOPE_RE = re.compile(r'(?<!\S)([!！]?)in[:：](?:"([^"]+)"|(\S+))', re.IGNORECASE)
+
+# 路径前缀区间的上界：prefix + 最大码位，覆盖该前缀下的所有路径
+PREFIX_END = '\U0010ffff'
+
+
+def _under(path, root):
+    return path == root or path.startswith(root.rstrip('/') + '/')
+
+
+def scope_roots(roots, in_paths, not_in_paths):
+    """把 in:/!in: 限定应用到一组根目录上，返回实际需要扫描/查询的目录"""
+    result = []
+    for root in roots:
+        if not in_paths:
+            result.append(root)
+        elif any(_under(root, p) for p in in_paths):
+            result.append(root)
+        else:
+            result.extend(p for p in in_paths if _under(p, root))
+    return [r for r in result if not any(_under(r, p) for p in not_in_paths)]
+
+
+def _parse_size(text):
+    m = re.fullmatch(r'(\d+(?:\.\d+)?)([kmgt]?b?)', text.lower())
+    if not m: return None
+    return int(float(m.group(1)) * SIZE_UNITS[m.group(2)])
+
+
+def _parse_date(text):
+    """2026 / 2026-01 / 2026-01-15 -> 该时间段的 [起, 止) 时间戳"""
+    m = re.fullmatch(r'(\d{4})(?:-(\d{1,2})(?:-(\d{1,2}))?)?', text)
+    if not m: return None
+    y, mo, d = int(m.group(1)), m.group(2), m.group(3)
+    try:
+        if d:
+            start = datetime(y, int(mo), int(d))
+            end = datetime.fromtimestamp(start.timestamp() + 86400)
+        elif mo:
+            start = datetime(y, int(mo), 1)
+            end = datetime(y + int(mo) // 12, int(mo) % 12 + 1, 1)
+        else:
+            start, end = datetime(y, 1, 1), datetime(y + 1, 1, 1)
+    except ValueError:
+        return None
+    return start.timestamp(), end.timestamp()
+
+
+def _parse_age(text):
+    """7d / 3h / 2w -> 距今秒数"""
+    m = re.fullmatch(r'(\d+(?:\.\d+)?)([hdwmy])', text.lower())
+    if not m: return None
+    return float(m.group(1)) * AGE_UNITS[m.group(2)]
+
+
+def _split_op(text):
+    m = re.match(r'(>=|<=|>|<|=)?(.*)', text)
+    return m.group(1) or '=', m.group(2)
+
 
 class SearchManager:
     def __init__(self):
@@ -8,6 +91,23 @@ class SearchManager:
         self.not_kws = []
         self.not_exts = []
         self.exact_exts = []
+        self.content_query = ""
+        self.grep_pattern = ""
+        self.grep_regex = False
+        # re: 文件名正则（原文 + 预编译对象）
+        self.name_pattern = ""
+        self.name_regex = None
+        # dupes: 查找重复文件，其余条件用于收窄候选范围
+        self.find_dupes = False
+        # 区间条件：[(下界含, 上界不含)]，None 表示不限；多个条件之间为 AND
+        self.size_ranges = []
+        self.mtime_ranges = []
+        self.kind_exts = []
+        # kind:dir 结果为目录（来自目录汇总表），size/modified 条件作用于目录总大小/最新修改时间
+        self.kind_dirs = False
+        # 路径限定：in:<目录> 只在这些子树中搜索，!in:<目录> 排除这些子树
+        self.in_paths = []
+        self.not_in_paths = []
 
     def set_query(self, text):
         self.and_kws = []
@@ -15,9 +115,57 @@ class SearchManager:
         self.not_kws = []
         self.not_exts = []
         self.exact_exts = []
+        self.content_query = ""
+        self.grep_pattern = ""
+        self.grep_regex = False
+        self.name_pattern = ""
+        self.name_regex = None
+        self.find_dupes = False
+        self.size_ranges = []
+        self.mtime_ranges = []
+        self.kind_exts = []
+        self.kind_dirs = False
+        self.in_paths = []
+        self.not_in_paths = []
         
         if not text or not text.strip(): return
 
+        # 0. 内容检索：content: 之后的整段文本作为短语在全文索引中匹配
+        head = text.lstrip()
+        if head[:8].lower().replace('：', ':') == "content:":
+            self.content_query = head[8:].strip()
+            return
+
+        # 0.05 查重：dupes: kind:video size:>100M in:~/Movies
+        if head[:6].lower().replace('：', ':') == "dupes:":
+            self.find_dupes = True
+            text = head[6:]
+
+        # 0.1 实时 grep：grep:词 / grep:"带空格的短语" / grep:/正则/，其余部分照常作为文件名过滤
+        m = re.search(r'(?<!\S)grep[:：](?:"([^"]*)"|/((?:\\.|[^/])*)/|(\S+))', text)
+        if m:
+            if m.group(2) is not None:
+                self.grep_pattern, self.grep_regex = m.group(2), True
+            else:
+                self.grep_pattern = m.group(1) if m.group(1) is not None else m.group(3)
+            text = text[:m.start()] + text[m.end():]
+
+        # 0.15 文件名正则：re:^IMG_\d{4}\.(jpe?g|heic)$ / re:"带空格 的正则"；非法正则退化为普通关键词
+        m = REGEX_RE.search(text)
+        if m:
+            pattern = m.group(1) if m.group(1) is not None else m.group(2)
+            regex = compile_name_regex(pattern)
+            if regex is not None:
+                self.name_pattern, self.name_regex = pattern, regex
+                text = text[:m.start()] + text[m.end():]
+
+        # 0.2 属性过滤：size:>500M / modified:<7d / modified:2026-01..2026-03 / kind:image|video，
+        #     编译为 size/mtime 区间交给索引；无法解析的写法保留为普通关键词
+        text = FILTER_RE.sub(self._take_filter, text)
+
+        # 0.3 路径限定：in:~/work/api / !in:~/work/api/vendor / in:"~/My Docs"
+        text = SCOPE_RE.sub(self._take_scope, text)
+
         # --- 核心修复：中英文全角符号标准化 ---
         # 将全角“！”替换为半角“!”，将全角“｜”替换为半角“|”
         text = text.replace('！', '!').replace('｜', '|')
@@ -47,9 +195,82 @@ class SearchManager:
             # 4. 普通多词 AND 逻辑
             self.and_kws = [w.lower() for w in text.split() if w]
 
-    def is_match(self, filename):
+    def _take_filter(self, m):
+        key, value = m.group(1).lower(), m.group(2)
+        if key == 'kind':
+            exts = []
+            for kind in re.split(r'[|｜,]', value.lower()):
+                if kind in ('dir', 'folder'):
+                    self.kind_dirs = True
+                elif kind:
+                    exts.extend(KIND_EXTS.get(kind, ['.' + kind.lstrip('.')]))
+            self.kind_exts = exts
+            return ''
+        rng = self._parse_size_range(value) if key == 'size' else self._parse_mtime_range(value)
+        if rng is None:
+            return m.group(0)
+        (self.size_ranges if key == 'size' else self.mtime_ranges).append(rng)
+        return ''
+
+    def _take_scope(self, m):
+        path = os.path.expanduser(m.group(2) or m.group(3))
+        if not os.path.isabs(path):
+            return m.group(0)
+        path = os.path.normpath(path)
+        (self.not_in_paths if m.group(1) else self.in_paths).append(path)
+        return ''
+
+    def scope_roots(self, roots):
+        return scope_roots(roots, self.in_paths, self.not_in_paths)
+
+    def in_scope(self, path):
+        if self.in_paths and not any(_under(path, p) for p in self.in_paths): return False
+        return not any(_under(path, p) for p in self.not_in_paths)
+
+    def _parse_size_range(self, value):
+        if '..' in value:
+            lo, hi = value.split('..', 1)
+            lo = _parse_size(lo) if lo else 0
+            hi = _parse_size(hi) if hi else None
+            if lo is None or (hi is None and value.split('..', 1)[1]): return None
+            return lo, None if hi is None else hi + 1
+        op, v = _split_op(value)
+        v = _parse_size(v)
+        if v is None: return None
+        return {'>': (v + 1, None), '>=': (v, None), '<': (None, v), '<=': (None, v + 1), '=': (v, v + 1)}[op]
+
+    def _parse_mtime_range(self, value):
+        if '..' in value:
+            lo, hi = value.split('..', 1)
+            lo_r = _parse_date(lo) if lo else (None, None)
+            hi_r = _parse_date(hi) if hi else (None, None)
+            if lo_r is None or hi_r is None: return None
+            return lo_r[0], hi_r[1]
+        op, v = _split_op(value)
+        age = _parse_age(v)
+        if age is not None:
+            # 相对时间描述的是“距今多久”：<7d 即最近 7 天内修改
+            cut = time.time() - age
+            return (cut, None) if op in ('<', '<=', '=') else (None, cut)
+        period = _parse_date(v)
+        if period is None: return None
+        start, end = period
+        return {'>': (end, None), '>=': (start, None), '<': (None, start), '<=': (None, end), '=': (start, end)}[op]
+
+    def has_filters(self):
+        return bool(self.size_ranges or self.mtime_ranges or self.kind_exts or self.kind_dirs
+                    or self.in_paths or self.not_in_paths)
+
+    def is_match(self, filename, size=None, mtime=None):
         if not filename: return False
         fn = filename.lower()
+
+        if self.name_regex is not None and not self.name_regex.search(filename): return False
+
+        # 属性过滤（实时扫描时使用；索引查询在 SQL 中完成）
+        if self.kind_exts and not any(fn.endswith(ext) for ext in self.kind_exts): return False
+        if size is not None and not all(self._in_range(size, r) for r in self.size_ranges): return False
+        if mtime is not None and not all(self._in_range(mtime, r) for r in self.mtime_ranges): return False
         
         # A. 排除逻辑
         if any(kw in fn for kw in self.not_kws): return False
@@ -71,4 +292,9 @@ class SearchManager:
         if self.and_kws:
             and_passed = all(ak in fn for ak in self.and_kws)
             
-        return or_passed and and_passed
\ No newline at end of file
+        return or_passed and and_passed
+
+    @staticmethod
+    def _in_range(value, rng):
+        lo, hi = rng
+        return (lo is None or value >= lo) and (hi is None or value < hi)
\ No newline at end of file
@@ -3,6 +3,7 @@ import os
 import threading
 from PyQt5.QtCore import QThread, pyqtSignal
 from concurrent.futures import ThreadPoolExecutor
+from file_record import FileRecord
 
 class FileSearchThread(QThread):
     results_batch_found = pyqtSignal(list)
@@ -20,12 +21,14 @@ class FileSearchThread(QThread):
         "/Volumes", "/cores", "/var", "/tmp"
     ]
 
-    def __init__(self, query, paths, manager, batch_size=50):
+    def __init__(self, query, paths, manager, batch_size=50, max_depth=100):
         super().__init__()
         self.query = query.strip().lower()
-        self.paths = paths
+        # manager 为已 set_query 的 SearchManager；in:/!in: 限定直接收窄扫描根目录
+        self.paths = manager.scope_roots(paths)
         self.manager = manager
         self.batch_size = batch_size
+        self.max_depth = max_depth
         self.stop_flag = False
         self.lock = threading.Lock()
         self.seen = set()
@@ -61,7 +64,7 @@ class FileSearchThread(QThread):
         self.search_finished.emit()
 
     def _walk(self, path, depth):
-        if self._should_stop() or depth > self.manager.search_depth:
+        if self._should_stop() or depth > self.max_depth:
             return
 
         # 顶层系统目录检查
@@ -78,7 +81,8 @@ class FileSearchThread(QThread):
                 files = []
                 for entry in entries:
                     if entry.is_dir(follow_symlinks=False):
-                        if entry.name not in self.IGNORED_DIRS and not entry.name.startswith('.'):
+                        if (entry.name not in self.IGNORED_DIRS and not entry.name.startswith('.')
+                                and self.manager.in_scope(entry.path)):
                             dirs.append(entry)
                     elif entry.is_file(follow_symlinks=False):
                         files.append(entry)
@@ -86,7 +90,8 @@ class FileSearchThread(QThread):
                 # 处理文件
                 for f in files:
                     if self._should_stop(): return
-                    self._handle(f.path, f.name, f.stat().st_mtime)
+                    st = f.stat()
+                    self._handle(f.path, f.name, st.st_mtime, st.st_size)
 
                 # 递归处理目录
                 for d in dirs:
@@ -99,8 +104,8 @@ class FileSearchThread(QThread):
         except Exception:
             pass
 
-    def _handle(self, path, name, mtime):
-        if not self.manager.should_include_file(name):
+    def _handle(self, path, name, mtime, size):
+        if not self.manager.is_match(name, size, mtime):
             return
         
         with self.lock:
@@ -108,7 +113,7 @@ class FileSearchThread(QThread):
                 return
             self.seen.add(path)
             
-        self.buffer.append({"name": name, "path": path, "mtime": mtime})
+        self.buffer.append(FileRecord(path, name, mtime, size))
         if len(self.buffer) >= self.batch_size:
             self._flush()
 
@@ -116,6 +121,6 @@ class FileSearchThread(QThread):
         with self.lock:
             if self.buffer:
                 # 按时间倒序
-                sorted_buffer = sorted(self.buffer, key=lambda x: -x["mtime"])
+                sorted_buffer = sorted(self.buffer, key=lambda x: -x.mtime)
                 self.results_batch_found.emit(sorted_buffer)
                 self.buffer.clear()
\ No newline at end of file
@@ -1,7 +1,7 @@
 import os
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, 
                              QLineEdit, QPushButton, QListWidget, QFileDialog, 
-                             QFrame, QAbstractItemView)
+                             QFrame, QAbstractItemView, QCheckBox)
 from PyQt5.QtCore import Qt, pyqtSignal
 
 class SettingsDialog(QDialog):
@@ -57,6 +57,24 @@ class SettingsDialog(QDialog):
         
         layout.addLayout(path_group)
 
+        # --- 隐藏文件与排除规则 ---
+        self.hidden_check = QCheckBox("索引隐藏文件（以 . 开头）")
+        self.hidden_check.setChecked(self.config.get("show_hidden", False))
+        layout.addWidget(self.hidden_check)
+
+        exclude_label = QLabel("排除规则 (逗号分隔，支持通配符，含 / 的按路径匹配):")
+        exclude_label.setStyleSheet("font-weight: bold; color: #555;")
+        self.exclude_input = QLineEdit(self.config.get("exclude_rules", ""))
+        self.exclude_input.setPlaceholderText("例如: build, *.tmp, ~/Downloads/old")
+        self.exclude_input.setStyleSheet("padding: 8px; border: 1px solid #ddd; border-radius: 4px;")
+        layout.addWidget(exclude_label)
+        layout.addWidget(self.exclude_input)
+
+        # --- 内容索引开关 ---
+        self.content_check = QCheckBox("启用文件内容索引 (content: 前缀搜索文本内容)")
+        self.content_check.setChecked(self.config.get("content_index", False))
+        layout.addWidget(self.content_check)
+
         # --- 分割线 ---
         line = QFrame()
         line.setFrameShape(QFrame.HLine)
@@ -90,8 +108,13 @@ class SettingsDialog(QDialog):
             self.path_list.takeItem(self.path_list.row(item))
 
     def get_config(self):
-        """返回修改后的配置字典"""
-        return {
+        """返回修改后的配置字典（保留对话框未涉及的字段）"""
+        cfg = dict(self.config)
+        cfg.update({
             "hotkey": self.hotkey_input.text().strip().lower(),
-            "search_paths": self.new_paths
-        }
\ No newline at end of file
+            "search_paths": self.new_paths,
+            "show_hidden": self.hidden_check.isChecked(),
+            "exclude_rules": self.exclude_input.text().strip(),
+            "content_index": self.content_check.isChecked()
+        })
+        return cfg
\ No newline at end of file
@@ -0,0 +1,112 @@
+# stall_watchdog.py
+# 界面卡顿监测（可选，默认关闭）：主线程上的心跳定时器测量事件循环延迟，
+# 辅助线程发现心跳停顿超过阈值时，通过 sys._current_frames() 抓取主线程调用栈；
+# 主线程恢复后把停顿时长、当时的查询与结果数以及采样到的调用栈写入日志。
+#
+# 用法：配置文件中设置 "stall_watchdog_ms": 200 即对超过 200ms 的停顿采样
+import os
+import sys
+import time
+import threading
+import traceback
+from collections import Counter
+from PyQt5.QtCore import QObject, QTimer
+
+LOG_PATH = os.path.expanduser("~/.mac_search_stalls.log")
+
+
+class StallWatchdog(QObject):
+    """必须在主线程创建；context() 在主线程每次心跳时调用，返回描述当前界面状态的字符串"""
+
+    # 心跳间隔；停顿期间辅助线程的采样间隔
+    INTERVAL_MS = 100
+    SAMPLE_MS = 50
+    # 单次停顿最多保留的调用栈样本数
+    MAX_SAMPLES = 100
+
+    def __init__(self, threshold_ms=200, context=None, log_path=LOG_PATH, parent=None):
+        super().__init__(parent)
+        self.threshold = threshold_ms / 1000
+        self.context = context
+        self.log_path = log_path
+        self._main_ident = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        # 辅助线程无法安全读取界面控件，这里保存最近一次心跳时的状态快照
+        self._snapshot = ""
+        self._samples = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        # 心跳是否在运行；QTimer 只能在主线程访问，辅助线程读这个标志
+        self._running = threading.Event()
+        self._thread = None
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.INTERVAL_MS)
+        self.timer.timeout.connect(self._beat)
+
+    def start(self):
+        if self.timer.isActive(): return
+        self._last_beat = time.perf_counter()
+        with self._lock:
+            self._samples = []
+        self.timer.start()
+        self._running.set()
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="stall-watchdog", daemon=True)
+            self._thread.start()
+
+    def pause(self):
+        """窗口隐藏时停止心跳，避免常驻托盘时周期性唤醒"""
+        self._running.clear()
+        self.timer.stop()
+
+    def stop(self):
+        self._running.clear()
+        self.timer.stop()
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(1)
+            self._thread = None
+
+    def _beat(self):
+        now = time.perf_counter()
+        lag = now - self._last_beat - self.INTERVAL_MS / 1000
+        self._last_beat = now
+        with self._lock:
+            samples, self._samples = self._samples, []
+        if lag >= self.threshold:
+            self._report(lag, samples)
+        if self.context is not None:
+            try:
+                self._snapshot = self.context()
+            except Exception:
+                self._snapshot = ""
+
+    def _watch(self):
+        while not self._stop.wait(self.SAMPLE_MS / 1000):
+            if not self._running.is_set(): continue
+            stalled = time.perf_counter() - self._last_beat - self.INTERVAL_MS / 1000
+            if stalled < self.threshold: continue
+            frame = sys._current_frames().get(self._main_ident)
+            if frame is None: continue
+            stack = ''.join(traceback.format_stack(frame))
+            del frame
+            with self._lock:
+                if len(self._samples) < self.MAX_SAMPLES:
+                    self._samples.append(stack)
+
+    def _report(self, lag, samples):
+        """相同的调用栈合并计数，出现次数最多的排在前面，即停顿期间主线程大部分时间所在的位置"""
+        lines = [f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 界面停顿 {lag * 1000:.0f}ms · {self._snapshot}"]
+        if not samples:
+            lines.append("  （停顿期间未采到调用栈）")
+        for stack, count in Counter(samples).most_common(3):
+            lines.append(f"  样本 {count}/{len(samples)}:")
+            lines.extend("    " + l for l in stack.rstrip().splitlines())
+        text = "\n".join(lines)
+        print(f"[StallWatchdog] 界面停顿 {lag * 1000:.0f}ms · {self._snapshot}")
+        try:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(text + "\n\n")
+        except OSError as e:
+            print(f"[StallWatchdog] 写入日志失败: {e}")
@@ -6,6 +6,7 @@ class StatusBar(QObject):
     show_window = pyqtSignal()
     show_settings = pyqtSignal()
     rebuild_index = pyqtSignal()
+    show_stats = pyqtSignal()
     quit_app = pyqtSignal()
 
     def __init__(self, app_instance):
@@ -20,6 +21,10 @@ class StatusBar(QObject):
         self._create_menu()
         self.tray.show()
 
+    def set_progress(self, text):
+        """索引进行中在托盘提示里显示进度，结束后恢复默认提示"""
+        self.tray.setToolTip(text or "文件快速搜索")
+
     def _create_menu(self):
         menu = QMenu()
         
@@ -33,6 +38,9 @@ class StatusBar(QObject):
         
         rebuild_action = menu.addAction("重新构建索引")
         rebuild_action.triggered.connect(self.rebuild_index.emit)
+
+        stats_action = menu.addAction("索引状态...")
+        stats_action.triggered.connect(self.show_stats.emit)
         
         menu.addSeparator()
         
@@ -0,0 +1,37 @@
+import gzip
+import json
+import pytest
+
+pytest.importorskip("watchdog")
+
+from event_trace import TraceReplayer
+
+
+def write_trace(path, lines):
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write('#' + json.dumps({'v': 1, 'roots': ['/r'], 'show_hidden': False, 'exclude_rules': ''}) + '\n')
+        for fields in lines:
+            f.write('\t'.join(fields) + '\n')
+
+
+def tree(root):
+    return sorted(str(p.relative_to(root)) + ('/' if p.is_dir() else f':{p.stat().st_size}')
+                  for p in root.rglob('*'))
+
+
+def test_replay_dir_move_into_existing_parent(tmp_path):
+    trace = tmp_path / "events.trace.gz"
+    write_trace(trace, [
+        ('0', 'm', '0', 'd/x.txt', '3'),
+        ('0', 'm', '0', 'e/y.txt', '4'),
+        ('0', 'V', '0', 'd', '', '0', 'e/d2'),
+        # 移动之后才出现的路径：不能在回放前预先创建
+        ('0', 'm', '0', 'e/d2/x.txt', '5'),
+        ('0', 'm', '0', 'e/d2/sub/z.txt', '6'),
+    ])
+    replayer = TraceReplayer(str(trace), speed=0, workdir=str(tmp_path / "work"))
+    report = replayer.run()
+
+    root = tmp_path / "work" / "tree" / "root0"
+    assert tree(root) == ['e/', 'e/d2/', 'e/d2/sub/', 'e/d2/sub/z.txt:6', 'e/d2/x.txt:5', 'e/y.txt:4']
+    assert report['missing'] == report['extra'] == report['wrong_size'] == 0
@@ -0,0 +1,148 @@
+import os
+import pytest
+
+pytest.importorskip("watchdog")
+
+from index_manager import IndexManager
+from search_manager import SearchManager
+
+
+@pytest.fixture
+def index(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    for name in ("report_final.txt", "reportXfinal.txt", "100%.txt", "100a.txt",
+                 "a\\b.txt", "axb.txt", "clip.mp4"):
+        (root / name).write_text("x")
+    mgr = IndexManager([str(root)], shard_dir=str(tmp_path / "shards"))
+    mgr.rebuild_index()
+    yield mgr
+    mgr.close()
+
+
+def names(mgr, query):
+    search_mgr = SearchManager()
+    search_mgr.set_query(query)
+    filters = mgr.compile_filters(search_mgr)
+    if search_mgr.name_regex is not None:
+        hits, _ = mgr.search_regex(filters, search_mgr.name_regex, sort='name')
+        return sorted(r.name for r in hits)
+    return sorted(r.name for r in mgr.search(filters, sort='name'))
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("report_final", ["report_final.txt"]),
+    ("!report_final report", ["reportXfinal.txt"]),
+    ("100%", ["100%.txt"]),
+    ("a\\b", ["a\\b.txt"]),
+    ("report_final|100%", ["100%.txt", "report_final.txt"]),
+    ("re:^report_fin", ["report_final.txt"]),
+])
+def test_like_wildcards_match_literally(index, query, expected):
+    assert names(index, query) == expected
+
+
+def test_search_name_escapes_keyword(index):
+    assert [r.name for r in index.search_name("t_f")] == ["report_final.txt"]
+
+
+def test_literal_prefilter_escapes_wildcards(index):
+    search_mgr = SearchManager()
+    search_mgr.set_query("re:100%")
+    where, params, _, _, _ = index.compile_filters(search_mgr)
+    assert params == ["%100\\%%"]
+    assert names(index, "re:100%") == ["100%.txt"]
+
+
+@pytest.mark.parametrize("sort, index_name", [
+    ("name", "idx_name_cover"), ("mtime", "idx_mtime_cover"),
+    ("size", "idx_size_cover"), ("frecency", "idx_frecency_cover"),
+])
+def test_sort_modes_use_covering_index(index, sort, index_name):
+    _, plan = last_plan(index, lambda: index.search(('1', [], None, 'file_index', ()), 10, sort))
+    assert f'COVERING INDEX {index_name}' in plan, plan
+
+
+def test_empty_query_lists_recent_files(index):
+    search_mgr = SearchManager()
+    search_mgr.set_query("")
+    filters = index.compile_filters(search_mgr)
+    page, plan = last_plan(index, lambda: index.search(filters, 3, 'mtime'))
+    assert len(page) == 3
+    assert 'COVERING INDEX idx_mtime_cover' in plan, plan
+
+
+def last_plan(mgr, run):
+    shard = next(iter(mgr.shards.values()))
+    plans = []
+    shard.read_conn.set_trace_callback(plans.append)
+    try:
+        result = run()
+    finally:
+        shard.read_conn.set_trace_callback(None)
+    plan = shard.read_conn.execute('EXPLAIN QUERY PLAN ' + plans[-1]).fetchall()
+    return result, ' '.join(row[-1] for row in plan)
+
+
+@pytest.mark.parametrize("query, sort, index_name, expected", [
+    ("kind:video", "frecency", "idx_ext", ["clip.mp4"]),
+    ("kind:video", "mtime", "idx_ext", ["clip.mp4"]),
+    ("size:>1M", "mtime", "idx_size_cover", ["big.bin"]),
+    ("modified:<1d", "size", "idx_mtime_cover", ["new.txt"]),
+])
+def test_selective_filters_use_their_own_index(tmp_path, query, sort, index_name, expected):
+    root = tmp_path / "root"
+    root.mkdir()
+    old = 1_000_000_000
+    for i in range(50):
+        path = root / f"f{i}.txt"
+        path.write_text("x")
+        os.utime(path, (old, old))
+    for name in ("clip.mp4", "big.bin"):
+        (root / name).write_text("x")
+        os.utime(root / name, (old, old))
+    with open(root / "big.bin", "wb") as f:
+        f.truncate(4 * 1024 * 1024)
+    os.utime(root / "big.bin", (old, old))
+    (root / "new.txt").write_text("x")
+    mgr = IndexManager([str(root)], shard_dir=str(tmp_path / "shards"))
+    try:
+        mgr.rebuild_index()
+        search_mgr = SearchManager()
+        search_mgr.set_query(query)
+        filters = mgr.compile_filters(search_mgr)
+        records, plan = last_plan(mgr, lambda: mgr.search(filters, 10, sort))
+        assert [r.name for r in records] == expected
+        assert index_name in plan, plan
+    finally:
+        mgr.close()
+
+
+def test_ext_column_migration(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    (root / "Movie.MP4").write_text("x")
+    mgr = IndexManager([str(root)], shard_dir=str(tmp_path / "shards"))
+    mgr.rebuild_index()
+    shard = mgr.shards[str(root)]
+    db_path = shard.db_path
+    with shard.lock:
+        shard.conn.execute("UPDATE file_index SET ext = ''")
+        shard.conn.execute('PRAGMA user_version=4')
+        shard.conn.commit()
+    mgr.close()
+
+    mgr = IndexManager([str(root)], shard_dir=str(tmp_path / "shards"))
+    try:
+        shard = mgr.shards[str(root)]
+        assert shard.db_path == db_path
+        # 打开时只改表结构，回填留给索引任务线程
+        assert mgr.needs_migration() and mgr.is_partial()
+        assert names(mgr, "Movie") == ["Movie.MP4"]
+        mgr.migrate_shards()
+        assert not mgr.needs_migration() and not mgr.is_partial()
+        assert shard.conn.execute('SELECT ext FROM file_index').fetchall() == [('.mp4',)]
+        assert shard.conn.execute('PRAGMA user_version').fetchone()[0] == 5
+        assert names(mgr, "kind:video") == ["Movie.MP4"]
+    finally:
+        mgr.close()
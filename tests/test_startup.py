@@ -0,0 +1,71 @@
+import sqlite3
+import pytest
+
+pytest.importorskip("watchdog")
+
+from index_manager import IndexManager
+
+
+def make_tree(root, names):
+    for name in names:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x")
+
+
+def test_import_legacy_index(tmp_path):
+    root = tmp_path / "root"
+    make_tree(root, ["a.txt", "sub/b.txt"])
+    legacy = tmp_path / "legacy.db"
+    conn = sqlite3.connect(legacy)
+    conn.execute('CREATE TABLE file_index (path TEXT PRIMARY KEY, name TEXT, mtime REAL, size INTEGER)')
+    conn.executemany('INSERT INTO file_index VALUES (?, ?, ?, ?)', [
+        (str(root / "a.txt"), "a.txt", 1.0, 1),
+        (str(root / "sub/b.txt"), "b.txt", 2.0, 1),
+        (str(root / ".hidden"), ".hidden", 3.0, 1),
+        ("/elsewhere/c.txt", "c.txt", 4.0, 1),
+    ])
+    conn.commit()
+    conn.close()
+
+    mgr = IndexManager([str(root)], shard_dir=str(tmp_path / "shards"))
+    mgr.LEGACY_DB_PATH = str(legacy)
+    try:
+        assert mgr.has_legacy_index()
+        assert mgr.import_legacy_index() == 2
+        assert sorted(r.name for r in mgr.search_name("")) == ["a.txt", "b.txt"]
+        assert not legacy.exists()
+        assert not mgr.has_legacy_index()
+    finally:
+        mgr.close()
+
+
+def test_first_launch_builds_partial_index_in_priority_order(tmp_path):
+    root = tmp_path / "root"
+    make_tree(root, [f"{top}/d{i}/f{i}.txt" for top in ("aaa", "Desktop") for i in range(20)])
+    mgr = IndexManager([str(root)], shard_dir=str(tmp_path / "shards"),
+                       pinned_paths=[str(root / "Desktop")])
+    mgr.CHECKPOINT_FILES, mgr.CHECKPOINT_SECS = 5, 0
+    shard = mgr.shards[str(root)]
+    seen = []
+    checkpoint = shard.checkpoint
+
+    def record(conn, batch, frontier, meta):
+        seen.append((mgr.is_partial(), [r.path for r in mgr.search_name("", 100)]))
+        checkpoint(conn, batch, frontier, meta)
+
+    shard.checkpoint = record
+    try:
+        assert not mgr.has_pending_rebuild()
+        assert mgr.needs_initial_build()
+        mgr.rebuild_index()
+
+        # 爬取过程中正式库已经可以搜到部分结果，且固定目录先于其他目录入库
+        midway = [paths for partial, paths in seen if partial and 0 < len(paths) < 40]
+        assert midway
+        assert all("Desktop" in p for p in midway[0])
+        assert not mgr.is_partial()
+        assert len(mgr.search_name("", 100)) == 40
+        assert not mgr.needs_initial_build()
+    finally:
+        mgr.close()
@@ -1,5 +1,6 @@
 # ui_widgets.py
 import os
+from bisect import bisect_left
 from PyQt5.QtWidgets import (QTreeWidget, QTreeWidgetItem, QHeaderView, 
                              QStyledItemDelegate, QMenu, QApplication, QStyle, QMessageBox)
 from PyQt5.QtCore import Qt, pyqtSignal, QUrl, QMimeData, QRectF
@@ -47,6 +48,10 @@ class SearchResultItem(QTreeWidgetItem):
         super().__init__(["", size, time_str, pdir])
         self.full_path = full_path
         self.mtime = mtime  # 存储原始时间戳（数值）
+        # 与 SQL ORDER BY 一致的排序键，由调用方设置；常驻查询增量插入时用于二分定位
+        self.sort_key = None
+        # 对应的 FileRecord，结果列表被截断时用作下一页的 keyset 游标
+        self.record = None
         self.setData(0, Qt.UserRole, name)
 
     def __lt__(self, other):
@@ -55,9 +60,45 @@ class SearchResultItem(QTreeWidgetItem):
         # 当我们在 main.py 调用 DescendingOrder（降序）时，最大的 mtime (最新的) 会排在最上面。
         return self.mtime < other.mtime
 
+class _Rank:
+    """把升序/降序统一成升序比较，供 bisect 使用"""
+    __slots__ = ('key', 'desc')
+
+    def __init__(self, key, desc):
+        self.key = key
+        self.desc = desc
+
+    def __lt__(self, other):
+        return other.key < self.key if self.desc else self.key < other.key
+
+
+class _SortKeys:
+    """以序列方式惰性访问顶层结果项的排序键，二分时只读取 O(log n) 个项"""
+
+    def __init__(self, widget, desc):
+        self.widget = widget
+        self.desc = desc
+
+    def __len__(self):
+        return self.widget.topLevelItemCount()
+
+    def __getitem__(self, i):
+        return _Rank(self.widget.topLevelItem(i).sort_key, self.desc)
+
+
+class DuplicateGroupItem(QTreeWidgetItem):
+    """查重结果的分组标题行，子项为同一组内容相同的文件"""
+    def __init__(self, title):
+        super().__init__(["", "", "", ""])
+        self.full_path = None
+        self.setData(0, Qt.UserRole, title)
+        self.setFlags(Qt.ItemIsEnabled)
+
 class SearchResultWidget(QTreeWidget):
     open_signal = pyqtSignal(str)
     finder_signal = pyqtSignal(str)
+    # 滚动接近底部时请求加载下一页
+    load_more = pyqtSignal()
     
     def __init__(self):
         super().__init__()
@@ -84,13 +125,79 @@ class SearchResultWidget(QTreeWidget):
         self.customContextMenuRequested.connect(self._menu)
         # ✅ 新增：连接双击信号
         self.itemDoubleClicked.connect(self._on_item_double_clicked)
+        self.verticalScrollBar().valueChanged.connect(self._on_scroll)
+        # path -> 顶层结果项，供增量更新按路径定位
+        self._by_path = {}
+
+    def clear(self):
+        self._by_path.clear()
+        super().clear()
+
+    def add_items(self, items):
+        """按顺序追加一批顶层结果；已由增量更新插入过的同路径项以分页结果为准"""
+        for item in items:
+            old = self._by_path.get(item.full_path)
+            if old is not None:
+                self._take(old)
+            self._by_path[item.full_path] = item
+        self.addTopLevelItems(items)
+
+    def _take(self, item):
+        self._by_path.pop(item.full_path, None)
+        self.takeTopLevelItem(self.indexOfTopLevelItem(item))
+
+    def remove_paths(self, paths, prefixes=()):
+        """移除指定路径及目录前缀下的顶层结果"""
+        for path in paths:
+            item = self._by_path.get(path)
+            if item is not None:
+                self._take(item)
+        for prefix in prefixes:
+            for path in [p for p in self._by_path if p.startswith(prefix)]:
+                self._take(self._by_path[path])
+
+    def insert_sorted(self, item, desc, at_end=True):
+        """按 item.sort_key 插入到已有结果中的对应位置（结果本身已按该键有序），同路径的旧项先移除。
+        at_end=False 表示后面还有未加载的分页：排在已加载末尾之后的项不插入，留给下一页，返回 False"""
+        old = self._by_path.get(item.full_path)
+        if old is not None:
+            self._take(old)
+        n = self.topLevelItemCount()
+        pos = bisect_left(_SortKeys(self, desc), _Rank(item.sort_key, desc), 0, n)
+        if pos >= n and not at_end:
+            return False
+        self._by_path[item.full_path] = item
+        self.insertTopLevelItem(pos, item)
+        return True
+
+    def trim(self, limit):
+        """只保留前 limit 个顶层结果，返回保留的最后一项；没有截断时返回 None"""
+        n = self.topLevelItemCount()
+        if n <= limit:
+            return None
+        for i in range(n - 1, limit - 1, -1):
+            item = self.takeTopLevelItem(i)
+            self._by_path.pop(item.full_path, None)
+        return self.topLevelItem(limit - 1) if limit else None
+
+    def add_group(self, title, items):
+        """添加一组重复文件：标题行 + 展开的文件行"""
+        group = DuplicateGroupItem(title)
+        self.addTopLevelItem(group)
+        group.addChildren(items)
+        group.setExpanded(True)
+
+    def _on_scroll(self, value):
+        bar = self.verticalScrollBar()
+        if bar.maximum() > 0 and value >= bar.maximum() - bar.pageStep() // 2:
+            self.load_more.emit()
     def _on_item_double_clicked(self, item, column):
         """
         根据双击的列执行不同操作：
         Column 0: 文件名 -> 打开文件
         Column 3: 路径   -> 在 Finder 中定位
         """
-        if not item: return
+        if not item or not item.full_path: return
         
         # 如果双击的是第一列（文件名列）
         if column == 0:
@@ -105,10 +212,10 @@ class SearchResultWidget(QTreeWidget):
             self.open_signal.emit(item.full_path)
 
     def _get_selected_paths(self):
-        return [item.full_path for item in self.selectedItems()]
+        return [item.full_path for item in self.selectedItems() if item.full_path]
 
     def _menu(self, pos):
-        items = self.selectedItems()
+        items = [i for i in self.selectedItems() if i.full_path]
         if not items: return
         
         m = QMenu()
@@ -147,7 +254,7 @@ class SearchResultWidget(QTreeWidget):
             QApplication.clipboard().setMimeData(mime)
 
     def _trash_batch(self):
-        items = self.selectedItems()
+        items = [i for i in self.selectedItems() if i.full_path]
         if not items: return
         
         if QMessageBox.question(self, '确认删除', f'确定要将选中的 {len(items)} 个文件移至废纸篓吗？',
@@ -157,7 +264,11 @@ class SearchResultWidget(QTreeWidget):
                 url = NSURL.fileURLWithPath_(item.full_path)
                 success, _, _ = fm.trashItemAtURL_resultingItemURL_error_(url, None, None)
                 if success:
-                    self.takeTopLevelItem(self.indexOfTopLevelItem(item))
+                    parent = item.parent()
+                    if parent is not None:
+                        parent.removeChild(item)
+                    else:
+                        self._take(item)
 
     def keyPressEvent(self, event):
         items = self.selectedItems()